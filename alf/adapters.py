@@ -1,10 +1,100 @@
 # -*- coding: utf-8 -*-
 
+import socket
+
 import requests
+from requests.packages.urllib3.connection import HTTPConnection
+
+
+KEEPALIVE_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+DRAIN_LIMIT = 64 * 1024
+
+
+class KeepAliveAdapter(requests.adapters.HTTPAdapter):
 
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = \
+            HTTPConnection.default_socket_options + KEEPALIVE_SOCKET_OPTIONS
+        super(KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
 
-def mount_retry_adapter(session, retries):
-    adapter = requests.adapters.HTTPAdapter(max_retries=retries)
 
+def build_adapter(retries=None, tcp_keepalive=False, **pool_options):
+    if retries is not None:
+        pool_options['max_retries'] = retries
+
+    if tcp_keepalive:
+        return KeepAliveAdapter(**pool_options)
+    return requests.adapters.HTTPAdapter(**pool_options)
+
+
+def mount_adapter(session, adapter):
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+
+
+def mount_retry_adapter(session, retries, **pool_options):
+    mount_adapter(session, build_adapter(retries, **pool_options))
+
+
+def reset_pools(session):
+    # The connections opened before a fork are left to the parent process,
+    # the pools are replaced instead of closed.
+    for adapter in set(session.adapters.values()):
+        if isinstance(adapter, requests.adapters.HTTPAdapter):
+            adapter.proxy_manager = {}
+            adapter.init_poolmanager(adapter._pool_connections,
+                                     adapter._pool_maxsize,
+                                     block=adapter._pool_block)
+
+
+def release_response(response, limit=DRAIN_LIMIT):
+    # A discarded response is read up to limit bytes so its connection goes
+    # back to the pool; the connection of a larger body is closed instead.
+    drained = response._content_consumed
+    if not drained:
+        length = response.headers.get('Content-Length', '')
+        if not length.isdigit() or int(length) <= limit:
+            try:
+                read = 0
+                for chunk in response.iter_content(8192):
+                    read += len(chunk)
+                    if read > limit:
+                        break
+                else:
+                    drained = True
+            except (requests.RequestException, IOError):
+                pass
+
+    response.close()
+    return drained
+
+
+def pool_stats(session):
+    stats = []
+    for adapter in set(session.adapters.values()):
+        poolmanager = getattr(adapter, 'poolmanager', None)
+        if poolmanager is None:
+            continue
+
+        for key in poolmanager.pools.keys():
+            pool = poolmanager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+
+            # Free slots of the pool queue are filled with None. Idle
+            # connections without a socket were closed and will be opened
+            # again on their next request.
+            queue = list(pool.pool.queue)
+            idle = [conn for conn in queue if conn is not None]
+            stats.append({
+                'scheme': pool.scheme,
+                'host': pool.host,
+                'port': pool.port,
+                'maxsize': pool.pool.maxsize,
+                'in_use': pool.pool.maxsize - len(queue),
+                'idle': len(idle),
+                'closed': len([conn for conn in idle if conn.sock is None]),
+                'num_connections': pool.num_connections,
+                'num_requests': pool.num_requests,
+            })
+    return stats
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+from base64 import b64encode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from alf.tokens import Token, TokenError, TokenStorage
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+BAD_TOKEN = 401
+
+
+class RequestsTransport(object):
+
+    def __init__(self, session=None, executor=None):
+        self._session = session or requests.Session()
+        self._executor = executor
+
+    async def request(self, method, url, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(self._session.request, method, url, **kwargs))
+
+    async def close(self):
+        self._session.close()
+
+
+class AiohttpTransport(object):
+
+    def __init__(self, session=None):
+        if aiohttp is None:
+            raise RuntimeError('AiohttpTransport requires aiohttp')
+        self._session = session
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def _get_timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def request(self, method, url, **kwargs):
+        auth = kwargs.pop('auth', None)
+        if auth is not None:
+            credentials = '{}:{}'.format(*auth).encode('latin1')
+            headers = dict(kwargs.get('headers') or {})
+            headers['Authorization'] = 'Basic {}'.format(
+                b64encode(credentials).decode('ascii'))
+            kwargs['headers'] = headers
+        if kwargs.get('timeout') is not None:
+            kwargs['timeout'] = self._get_timeout(kwargs['timeout'])
+        else:
+            kwargs.pop('timeout', None)
+
+        async with self._get_session().request(method, url, **kwargs) as resp:
+            content = await resp.read()
+
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.url = str(resp.url)
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        return response
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def default_transport():
+    if aiohttp is not None:
+        return AiohttpTransport()
+    return RequestsTransport()
+
+
+class AsyncTokenManager(object):
+
+    def __init__(self, token_endpoint, client_id, client_secret,
+                 transport, token_storage=None, token_request_params=None):
+        self._token_endpoint = token_endpoint
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._token_request_params = token_request_params or {}
+        self._token_storage = TokenStorage(token_storage, self._get_cache_key())
+        self._has_custom_storage = token_storage is not None
+        self._transport = transport
+        self._token = Token()
+        self._lock = None
+
+    def _get_cache_key(self):
+        return '{}_{}'.format(self._token_endpoint, self._client_id)
+
+    def _get_lock(self):
+        # Created on first use to be bound to the running loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _has_token(self):
+        return self._token.is_valid()
+
+    async def get_token(self):
+        token = self._token
+        if token.is_valid():
+            return token.access_token
+
+        async with self._get_lock():
+            if not self._has_token():
+                await self._update_token()
+
+            return self._token.access_token
+
+    async def _call_storage(self, method, *args):
+        # Custom storages (Redis, Memcache...) do blocking I/O, so they are
+        # called on the loop's executor.
+        if not self._has_custom_storage:
+            return method(*args)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, method, *args)
+
+    async def _get_token_data(self):
+        token_data = await self._call_storage(
+            self._token_storage.request_token)
+        if not token_data:
+            token_data = await self._request_token()
+            expires_in = token_data.get('expires_in', 0)
+            token_data['expires_on'] = Token.calc_expires_on(expires_in)
+        return token_data
+
+    async def reset_token(self):
+        self._token = Token()
+        await self._call_storage(self._token_storage, self._token)
+
+    async def _update_token(self):
+        token_data = await self._get_token_data()
+        access_token = token_data.get('access_token', '')
+        expires_on = token_data.get('expires_on', 0)
+        token = Token(access_token, expires_on)
+        await self._call_storage(self._token_storage, token)
+        self._token = token
+
+    async def _request_token(self):
+        response = await self._transport.request(
+            'POST',
+            self._token_endpoint,
+            data={'grant_type': 'client_credentials'},
+            auth=(self._client_id, self._client_secret),
+            timeout=self._token_request_params.get('timeout'))
+
+        if not response.ok:
+            raise TokenError('Failed to request token', response)
+
+        return response.json()
+
+
+class AsyncClient(object):
+
+    token_manager_class = AsyncTokenManager
+
+    def __init__(self, token_endpoint, client_id, client_secret,
+                 token_storage=None, token_request_params=None,
+                 transport=None):
+        self._token_endpoint = token_endpoint
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._token_storage = token_storage
+        self._token_request_params = token_request_params
+        self._transport = transport or default_transport()
+
+        self._token_manager = self.token_manager_class(
+            token_endpoint=self._token_endpoint,
+            client_id=self._client_id,
+            client_secret=self._client_secret,
+            transport=self._transport,
+            token_storage=self._token_storage,
+            token_request_params=self._token_request_params)
+
+    async def _request(self, method, url, **kwargs):
+        access_token = await self._token_manager.get_token()
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers['Authorization'] = 'Bearer {}'.format(access_token)
+        return await self._transport.request(
+            method, url, headers=headers, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        try:
+            response = await self._request(method, url, **kwargs)
+            if response.status_code != BAD_TOKEN:
+                return response
+
+            await self._token_manager.reset_token()
+            return await self._request(method, url, **kwargs)
+        except TokenError as error:
+            await self._token_manager.reset_token()
+            return error.response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def options(self, url, **kwargs):
+        return await self.request('OPTIONS', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self.request('HEAD', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request('PUT', url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request('PATCH', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def close(self):
+        await self._transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
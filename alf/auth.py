@@ -7,7 +7,8 @@ class BearerTokenAuth(requests.auth.AuthBase):
 
     def __init__(self, access_token):
         self._access_token = access_token
+        self._authorization = 'Bearer {}'.format(access_token)
 
     def __call__(self, request):
-        request.headers['Authorization'] = 'Bearer {}'.format(self._access_token)
+        request.headers['Authorization'] = self._authorization
         return request
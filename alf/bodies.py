@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+
+DEFAULT_BODY_REPLAY_LIMIT = 1024 * 1024
+
+
+class MemoryViewBody(object):
+    # A seekable file-like view of a bytes-like object: the chunks read are
+    # slices of the same buffer, so nothing is copied to send it again.
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def __len__(self):
+        return len(self._view) - self._position
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size=-1):
+        start = self._position
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = min(start + size, len(self._view))
+        self._position = end
+        return self._view[start:end]
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, min(offset, len(self._view)))
+        return self._position
+
+
+class ReplayableIterable(object):
+    # Keeps the chunks of a one-shot iterable up to a limit of bytes, so it
+    # can be iterated again to send the same body.
+
+    def __init__(self, iterable, limit=DEFAULT_BODY_REPLAY_LIMIT):
+        self._iterator = iter(iterable)
+        self._limit = limit
+        self._chunks = []
+        self._size = 0
+        self.replayable = True
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield chunk
+
+        for chunk in self._iterator:
+            if self.replayable:
+                self._size += len(chunk)
+                if self._size > self._limit:
+                    self.replayable = False
+                    self._chunks = []
+                else:
+                    self._chunks.append(chunk)
+            yield chunk
+
+
+def make_replayable(data, limit=DEFAULT_BODY_REPLAY_LIMIT):
+    if isinstance(data, (bytearray, memoryview)):
+        return MemoryViewBody(data)
+
+    if data is None or hasattr(data, 'read') \
+            or isinstance(data, (str, bytes, list, tuple, dict)) \
+            or not hasattr(data, '__iter__'):
+        return data
+
+    return ReplayableIterable(data, limit)
+
+
+def rewind_body(request):
+    body = request.body
+    if body is None or isinstance(body, (str, bytes)):
+        return True
+
+    if isinstance(body, ReplayableIterable):
+        return body.replayable
+
+    position = getattr(request, '_body_position', None)
+    if hasattr(body, 'seek') and isinstance(position, int):
+        try:
+            body.seek(position)
+            return True
+        except (IOError, OSError):
+            return False
+
+    return False
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import email.utils
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from alf import forks
+from alf.tokens import monotonic
+
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+
+
+def parse_cache_control(value):
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _parse_date(value):
+    date = email.utils.parsedate_tz(value) if value else None
+    return email.utils.mktime_tz(date) if date else None
+
+
+def freshness_lifetime(headers):
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0
+
+    age = headers.get('Age', '0')
+    age = int(age) if age.isdigit() else 0
+    max_age = directives.get('max-age')
+    if max_age is not None and max_age.isdigit():
+        return max(0, int(max_age) - age)
+
+    expires = _parse_date(headers.get('Expires'))
+    if expires is not None:
+        date = _parse_date(headers.get('Date')) or time.time()
+        return max(0, expires - date - age)
+
+    return None
+
+
+class CacheEntry(object):
+
+    __slots__ = ('url', 'status_code', 'reason', 'headers', 'content',
+                 'encoding', 'vary', 'expires_at', 'size')
+
+    def __init__(self, response, vary, lifetime):
+        self.url = response.url
+        self.status_code = response.status_code
+        self.reason = response.reason
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.content = response.content
+        self.encoding = response.encoding
+        self.vary = vary
+        self.expires_at = monotonic() + (lifetime or 0)
+        self.size = len(self.content) + sum(
+            len(name) + len(value) for name, value in self.headers.items())
+
+    def is_fresh(self):
+        return self.expires_at > monotonic()
+
+    def has_validators(self):
+        return 'ETag' in self.headers or 'Last-Modified' in self.headers
+
+    def validators(self):
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def revalidate(self, response):
+        # A 304 carries the new freshness of the stored response.
+        for name, value in response.headers.items():
+            if name.lower() not in ('content-length', 'content-encoding',
+                                    'transfer-encoding'):
+                self.headers[name] = value
+        self.expires_at = monotonic() + (freshness_lifetime(self.headers)
+                                         or 0)
+
+    def to_response(self, request=None):
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.content
+        response.request = request
+        response.elapsed = timedelta(0)
+        response.from_cache = True
+        return response
+
+
+class ResponseCache(object):
+
+    # A LRU of responses bounded by their size in bytes. Stale responses
+    # with an ETag or Last-Modified are kept to be revalidated.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entry_bytes=None):
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes or max_bytes // 10
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def get(self, key, headers):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if any(headers.get(name) != value
+                   for name, value in entry.vary.items()):
+                return None
+
+            if not entry.is_fresh() and not entry.has_validators():
+                self._remove(key)
+                return None
+
+            self._entries[key] = self._entries.pop(key)
+            return entry
+
+    def store(self, key, response, headers):
+        if response.status_code != 200:
+            return None
+
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        vary = response.headers.get('Vary', '')
+        if 'no-store' in directives or vary.strip() == '*':
+            return None
+
+        lifetime = freshness_lifetime(response.headers)
+        if not lifetime and 'ETag' not in response.headers \
+                and 'Last-Modified' not in response.headers:
+            return None
+
+        entry = CacheEntry(response, dict(
+            (name.strip(), headers.get(name.strip()))
+            for name in vary.split(',') if name.strip()), lifetime)
+        if entry.size > self._max_entry_bytes:
+            return None
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
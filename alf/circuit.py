@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+
+from alf import forks
+from alf.tokens import TokenError, monotonic
+
+
+class CircuitOpenError(TokenError):
+    pass
+
+
+class CircuitBreaker(object):
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, backoff=1, max_backoff=60,
+                 jitter=0.5):
+        self._failure_threshold = failure_threshold
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._jitter = jitter
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._openings = 0
+        self._retry_on = None
+        self._probing = False
+        self.state = self.CLOSED
+        self.last_response = None
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._probing = False
+
+    def retry_in(self):
+        if self.state != self.OPEN:
+            return 0
+        return max(0, self._retry_on - monotonic())
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self._failures,
+            'openings': self._openings,
+            'retry_in': self.retry_in(),
+        }
+
+    def call(self, func, *args, **kwargs):
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except TokenError as error:
+            if self.is_failure(error.response):
+                self._record_failure(error.response)
+            else:
+                self._record_success()
+            raise
+        except Exception:
+            self._record_failure(None)
+            raise
+
+        self._record_success()
+        return result
+
+    @staticmethod
+    def is_failure(response):
+        # Rejected credentials don't mean the endpoint is down.
+        return response is None or response.status_code >= 500 \
+            or response.status_code == 429
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN and self._retry_on <= monotonic():
+                self.state = self.HALF_OPEN
+                self._probing = False
+
+            # A single request probes the endpoint, the others fail fast
+            # until it succeeds.
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+
+        raise CircuitOpenError('Token endpoint circuit is open',
+                               self.last_response)
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._openings = 0
+            self._probing = False
+            self.state = self.CLOSED
+            self.last_response = None
+
+    def _record_failure(self, response):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            self.last_response = response
+            if self.state == self.HALF_OPEN \
+                    or self._failures >= self._failure_threshold:
+                self._open()
+
+    def _open(self):
+        backoff = min(self._max_backoff,
+                      self._backoff * 2 ** self._openings)
+        backoff *= 1 - self._jitter * random.random()
+        self._openings += 1
+        self._retry_on = monotonic() + backoff
+        self.state = self.OPEN
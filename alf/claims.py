@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import binascii
+import json
+import time
+
+
+def decode_claims(access_token):
+    # The signature is not verified, the claims are only used to know when
+    # the token expires.
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload.encode('ascii')).decode('utf-8'))
+    except (AttributeError, IndexError, TypeError, ValueError,
+            UnicodeError, binascii.Error):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def _numeric_claim(claims, name):
+    value = claims.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def jwt_expires_in(access_token, clock_skew=0, now=None):
+    claims = decode_claims(access_token)
+    if claims is None:
+        return None
+
+    expires_at = _numeric_claim(claims, 'exp')
+    if expires_at is None:
+        return None
+
+    now = time.time() if now is None else now
+    expires_in = expires_at - now
+
+    # With a local clock behind the issuer's, exp - now would be longer than
+    # the lifetime of the token.
+    issued_at = _numeric_claim(claims, 'nbf')
+    if issued_at is None:
+        issued_at = _numeric_claim(claims, 'iat')
+    if issued_at is not None:
+        expires_in = min(expires_in, expires_at - issued_at)
+
+    return max(0, expires_in - clock_skew)
@@ -1,13 +1,34 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import requests
+from requests.compat import urlparse
+from requests.sessions import merge_setting
+from requests.structures import CaseInsensitiveDict
 
+from alf import forks
+from alf.adapters import (build_adapter, mount_adapter, pool_stats,
+                          release_response, reset_pools)
+from alf.bodies import DEFAULT_BODY_REPLAY_LIMIT, make_replayable, rewind_body
+from alf.caches import parse_cache_control
+from alf.hedging import first_result
 from alf.managers import TokenManager
-from alf.tokens import TokenError
+from alf.metrics import (DISCARDED_RESPONSES, HEDGED_REQUESTS, HEDGE_WINS,
+                         NULL_METRICS, RESOURCE_RETRIES, RESPONSE_CACHE_HITS,
+                         RESPONSE_CACHE_MISSES, RETRY_BUDGET_REJECTIONS,
+                         UNAUTHORIZED_RETRIES)
+from alf.registry import TokenManagerRegistry, shared_registry
+from alf.retries import ResourceRetry
+from alf.tokens import TokenError, monotonic
 from alf.auth import BearerTokenAuth
 
 
 BAD_TOKEN = 401
+DEFAULT_MAX_WORKERS = 10
 
 
 class Client(requests.Session):
@@ -22,29 +43,366 @@ class Client(requests.Session):
         self._token_request_params = kwargs.pop('token_request_params', None)
 
         _token_retries = kwargs.pop('token_retries', None)
-        self._token_manager = self.token_manager_class(
-            token_endpoint=self._token_endpoint,
-            client_id=self._client_id,
-            client_secret=self._client_secret,
-            token_storage=self._token_storage,
-            token_request_params=self._token_request_params,
-            token_retries=_token_retries)
+        self._pool_options = self._pop_pool_options(kwargs)
+        self._token_manager_kwargs = {
+            'token_storage': self._token_storage,
+            'token_request_params': self._token_request_params,
+            'token_refresh_ratio': kwargs.pop('token_refresh_ratio', None),
+            'token_refresh_margin': kwargs.pop('token_refresh_margin', None),
+            'token_lease_ttl': kwargs.pop('token_lease_ttl', None),
+            'token_sync_interval': kwargs.pop('token_sync_interval', None),
+            'token_circuit_breaker': kwargs.pop('token_circuit_breaker', None),
+            'token_grace_period': kwargs.pop('token_grace_period', None),
+            'token_jwt_expiry': kwargs.pop('token_jwt_expiry', False),
+            'token_clock_skew': kwargs.pop('token_clock_skew', 0),
+            'metrics': kwargs.pop('metrics', None),
+        }
+        self._metrics = self._token_manager_kwargs['metrics'] or NULL_METRICS
+
+        # Clients sharing the token manager share its token and its
+        # connection pool to the token endpoint.
+        self._share_token_manager = kwargs.pop('share_token_manager', False)
+        if self._share_token_manager:
+            self._token_manager = shared_registry(
+                self.token_manager_class).acquire(
+                    self._token_endpoint, self._client_id,
+                    self._client_secret, **self._token_manager_kwargs)
+        else:
+            self._token_manager = self.token_manager_class(
+                token_endpoint=self._token_endpoint,
+                client_id=self._client_id,
+                client_secret=self._client_secret,
+                token_retries=_token_retries,
+                pool_options=self._pool_options,
+                **self._token_manager_kwargs)
+
+        self._max_tenants = kwargs.pop('max_tenants', None)
+        self._tenant_ttl = kwargs.pop('tenant_ttl', None)
+        self._body_replay_limit = kwargs.pop(
+            'body_replay_limit', DEFAULT_BODY_REPLAY_LIMIT)
+        self._resource_retries = ResourceRetry.from_value(
+            kwargs.pop('resource_retries', None))
+        self._hedging = kwargs.pop('hedging', None)
+        self._response_cache = kwargs.pop('response_cache', None)
+        self._token_manager_registry = None
+        self._registry_lock = threading.Lock()
+        self._auth = None
 
         super(Client, self).__init__(*args, **kwargs)
 
-    def _request(self, *args, **kwargs):
-        access_token = self._token_manager.get_token()
-        kwargs['auth'] = BearerTokenAuth(access_token)
+        if self._pool_options:
+            mount_adapter(self, build_adapter(**self._pool_options))
+
+        forks.register(self)
+
+    def _after_fork(self):
+        self._registry_lock = threading.Lock()
+        reset_pools(self)
+
+    def close(self):
+        if self._share_token_manager:
+            self._share_token_manager = False
+            shared_registry(self.token_manager_class).release(
+                self._token_endpoint, self._client_id)
+        super(Client, self).close()
+
+    def warm_up(self):
+        # Requests the token before forking workers, so they inherit it
+        # instead of requesting one each.
+        return self._token_manager.get_token()
+
+    @staticmethod
+    def _pop_pool_options(kwargs):
+        pool_options = {}
+        for option in ('pool_connections', 'pool_maxsize', 'pool_block',
+                       'tcp_keepalive'):
+            value = kwargs.pop(option, None)
+            if value is not None:
+                pool_options[option] = value
+        return pool_options or None
+
+    def pool_stats(self):
+        return {
+            'resource': pool_stats(self),
+            'token': pool_stats(self._token_manager._session),
+        }
+
+    def _get_token_manager_registry(self):
+        with self._registry_lock:
+            if self._token_manager_registry is None:
+                self._token_manager_registry = TokenManagerRegistry(
+                    token_manager_class=self.token_manager_class,
+                    max_size=self._max_tenants,
+                    ttl=self._tenant_ttl,
+                    session=self._token_manager._session,
+                    **self._token_manager_kwargs)
+            return self._token_manager_registry
+
+    def _get_token_manager(self, credentials=None, scope=None,
+                           audience=None):
+        token_manager = self._token_manager
+        if credentials is not None:
+            client_id, client_secret = credentials
+            token_manager = self._get_token_manager_registry().get(
+                self._token_endpoint, client_id, client_secret)
+
+        if scope or audience is not None:
+            token_manager = token_manager.for_scope(scope, audience)
+        return token_manager
+
+    def _get_auth(self, access_token):
+        auth = self._auth
+        if auth is None or auth._access_token != access_token:
+            auth = self._auth = BearerTokenAuth(access_token)
+        return auth
+
+    def _request(self, access_token, *args, **kwargs):
+        kwargs['auth'] = self._get_auth(access_token)
         return super(Client, self).request(*args, **kwargs)
 
+    @staticmethod
+    def _copy_request(request):
+        # The request already prepared is sent again, so its body is
+        # replayed instead of built and read twice.
+        request = request.copy()
+        if not rewind_body(request):
+            return None
+        return request
+
+    def _resend(self, request, access_token, timeout=None,
+                allow_redirects=True, proxies=None, stream=None, verify=None,
+                cert=None, **kwargs):
+        # The header is not set again if a redirect removed it.
+        if 'Authorization' in request.headers:
+            self._get_auth(access_token)(request)
+
+        send_kwargs = {'timeout': timeout, 'allow_redirects': allow_redirects}
+        send_kwargs.update(self.merge_environment_settings(
+            request.url, proxies or {}, stream, verify, cert))
+        return self.send(request, **send_kwargs)
+
+    @staticmethod
+    def _get_method_and_host(args, kwargs):
+        method = args[0] if args else kwargs['method']
+        url = args[1] if len(args) > 1 else kwargs['url']
+        return method, urlparse(url).hostname
+
+    def _hedged_request(self, access_token, *args, **kwargs):
+        # Both attempts use the same token and only the response of the
+        # winner is seen, so a 401 resets the token once.
+        hedging = self._hedging
+        method, host = self._get_method_and_host(args, kwargs)
+        if not hedging.is_hedged_method(method) \
+                or kwargs.get('data') is not None:
+            return self._request(access_token, *args, **kwargs)
+
+        executor = hedging.get_executor()
+        hedging.budget.record_request()
+        started = monotonic()
+        first = executor.submit(self._request, access_token, *args, **kwargs)
+        done, _ = wait([first], timeout=hedging.delay())
+        if done or not hedging.budget.withdraw(host):
+            response = first.result()
+            hedging.observe(monotonic() - started)
+            return response
+
+        self._metrics.increment(HEDGED_REQUESTS, host=host)
+        second = executor.submit(self._request, access_token, *args, **kwargs)
+        winner = first_result([first, second])
+        hedging.observe(monotonic() - started)
+        if winner is second:
+            self._metrics.increment(HEDGE_WINS, host=host)
+        return winner.result()
+
+    def _release_response(self, response):
+        drained = release_response(response)
+        if self._metrics.enabled:
+            self._metrics.increment(DISCARDED_RESPONSES,
+                                    result='drained' if drained else 'closed')
+
+    def _attempt(self, access_token, *args, **kwargs):
+        if self._hedging is not None:
+            return self._hedged_request(access_token, *args, **kwargs)
+        return self._request(access_token, *args, **kwargs)
+
+    def _request_with_retries(self, access_token, *args, **kwargs):
+        retry = self._resource_retries
+        method, host = self._get_method_and_host(args, kwargs)
+        if retry is None or not retry.is_retryable_method(method):
+            return self._attempt(access_token, *args, **kwargs)
+
+        retry.budget.record_request()
+        request = None
+        attempt = 0
+        while True:
+            response = error = None
+            try:
+                if request is None:
+                    response = self._attempt(access_token, *args, **kwargs)
+                else:
+                    response = self._resend(request, access_token, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                error = exception
+
+            if attempt >= retry.total \
+                    or not retry.is_retryable(response, error):
+                break
+
+            sent = response.request if response is not None \
+                else error.request
+            backoff = retry.backoff(attempt, response)
+            request = self._copy_request(sent) if sent is not None else None
+            if request is None or backoff > retry.max_retry_after:
+                break
+
+            if not retry.budget.withdraw(host):
+                self._metrics.increment(RETRY_BUDGET_REJECTIONS, host=host)
+                break
+
+            self._metrics.increment(RESOURCE_RETRIES, host=host)
+            if response is not None:
+                self._release_response(response)
+            time.sleep(backoff)
+            attempt += 1
+
+        if error is not None:
+            raise error
+        return response
+
     def request(self, *args, **kwargs):
+        token_manager = self._get_token_manager(
+            kwargs.pop('credentials', None),
+            kwargs.pop('scope', None),
+            kwargs.pop('audience', None))
+        if kwargs.get('data') is not None:
+            kwargs['data'] = make_replayable(
+                kwargs['data'], self._body_replay_limit)
+
+        if self._response_cache is not None and self._is_cacheable(args,
+                                                                    kwargs):
+            return self._cached_request(token_manager, *args, **kwargs)
+        return self._authorized_request(token_manager, *args, **kwargs)
+
+    @staticmethod
+    def _is_cacheable(args, kwargs):
+        method = args[0] if args else kwargs['method']
+        return method.upper() == 'GET' and not kwargs.get('stream') \
+            and not any(kwargs.get(name) for name in ('data', 'json', 'files'))
+
+    def _get_cache_key(self, token_manager, args, kwargs):
+        request = requests.PreparedRequest()
+        request.prepare_url(args[1] if len(args) > 1 else kwargs['url'],
+                            merge_setting(kwargs.get('params'), self.params))
+        # Responses are kept for the credentials and scope of the token
+        # manager instead of the token, so they outlive token renewals.
+        return token_manager._get_storage_key(), request.url
+
+    def _cached_request(self, token_manager, *args, **kwargs):
+        cache = self._response_cache
+        key = self._get_cache_key(token_manager, args, kwargs)
+        headers = merge_setting(kwargs.get('headers'), self.headers,
+                                dict_class=CaseInsensitiveDict)
+        directives = parse_cache_control(headers.get('Cache-Control'))
+
+        entry = None if 'no-cache' in directives else cache.get(key, headers)
+        if entry is not None and entry.is_fresh():
+            self._metrics.increment(RESPONSE_CACHE_HITS, result='fresh')
+            return entry.to_response()
+
+        if entry is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {},
+                                     **entry.validators())
+        response = self._authorized_request(token_manager, *args, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            self._metrics.increment(RESPONSE_CACHE_HITS, result='revalidated')
+            entry.revalidate(response)
+            self._release_response(response)
+            return entry.to_response(response.request)
+
+        self._metrics.increment(RESPONSE_CACHE_MISSES)
+        if 'no-store' not in directives:
+            cache.store(key, response, headers)
+        return response
+
+    def _authorized_request(self, token_manager, *args, **kwargs):
         try:
-            response = self._request(*args, **kwargs)
+            access_token = token_manager.get_token()
+            response = self._request_with_retries(
+                access_token, *args, **kwargs)
             if response.status_code != BAD_TOKEN:
                 return response
 
-            self._token_manager.reset_token()
-            return self._request(*args, **kwargs)
+            request = self._copy_request(response.request)
+            if request is None:
+                return response
+
+            # The rejected response is released before the retry, which can
+            # then reuse its connection, and before a token error replaces
+            # it.
+            self._release_response(response)
+            self._metrics.increment(UNAUTHORIZED_RETRIES)
+            token_manager.reset_token(access_token)
+            access_token = token_manager.get_token()
+            return self._resend(request, access_token, **kwargs)
         except TokenError as error:
-            self._token_manager.reset_token()
+            token_manager.reset_token()
+            # The circuit breaker fails fast without a response when the
+            # endpoint could not be reached.
+            if error.response is None:
+                raise
             return error.response
+
+    def _request_batch_item(self, item):
+        if isinstance(item, dict):
+            kwargs = dict(item)
+            method, url = kwargs.pop('method'), kwargs.pop('url')
+        else:
+            method, url = item[0], item[1]
+            kwargs = dict(item[2]) if len(item) > 2 else {}
+
+        try:
+            return self.request(method, url, **kwargs)
+        except Exception as error:
+            return error
+
+    def imap(self, batch, max_workers=DEFAULT_MAX_WORKERS, ordered=True):
+        # Requests the token before the workers start, so they don't wait
+        # for it one after the other.
+        try:
+            self._token_manager.get_token()
+        except (TokenError, requests.RequestException):
+            pass
+
+        items = enumerate(batch)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = OrderedDict()
+
+            def submit():
+                for index, item in items:
+                    future = executor.submit(self._request_batch_item, item)
+                    pending[future] = index
+                    return True
+                return False
+
+            # Keeps at most two requests per worker in flight, so large
+            # batches are not loaded at once.
+            for _ in range(max_workers * 2):
+                if not submit():
+                    break
+
+            while pending:
+                if ordered:
+                    future = next(iter(pending))
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = next(iter(done))
+
+                result = future.result()
+                index = pending.pop(future)
+                submit()
+                yield index, result
+
+    def map(self, batch, max_workers=DEFAULT_MAX_WORKERS):
+        return [result for index, result
+                in self.imap(batch, max_workers=max_workers)]
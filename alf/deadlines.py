@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+
+import requests
+from requests.packages.urllib3.util.timeout import Timeout
+
+from alf.tokens import monotonic
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class Deadline(object):
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._expires_at = monotonic() + seconds
+
+    @classmethod
+    def from_value(cls, deadline):
+        if deadline is None or isinstance(deadline, cls):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self):
+        return max(0, self._expires_at - monotonic())
+
+    def expired(self):
+        return self._expires_at <= monotonic()
+
+    def error(self):
+        return DeadlineExceeded(
+            'Deadline of {} seconds exceeded'.format(self.seconds))
+
+    def check(self):
+        if self.expired():
+            raise self.error()
+        return self.remaining()
+
+    def timeout(self, timeout=None):
+        self.check()
+        return DeadlineTimeout(self, timeout)
+
+
+class DeadlineTimeout(Timeout):
+
+    # urllib3 clones the timeout for each attempt, including the retries of
+    # its Retry, so each attempt gets the time left until the deadline.
+
+    MIN_TIMEOUT = 0.001
+
+    def __init__(self, deadline, timeout=None):
+        connect, read = timeout if isinstance(timeout, tuple) \
+            else (timeout, timeout)
+        Timeout.__init__(self,
+                         total=max(self.MIN_TIMEOUT, deadline.remaining()),
+                         connect=connect, read=read)
+        self.deadline = deadline
+        self._timeout = timeout
+
+    def clone(self):
+        return DeadlineTimeout(self.deadline, self._timeout)
+
+
+def get_deadline(timeout):
+    return getattr(timeout, 'deadline', None)
+
+
+@contextmanager
+def acquired(lock, deadline=None):
+    if deadline is None:
+        lock.acquire()
+    elif not lock.acquire(True, deadline.remaining()):
+        raise deadline.error()
+
+    try:
+        yield
+    finally:
+        lock.release()
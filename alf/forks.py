@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+import os
+import weakref
+
+
+_instances = weakref.WeakSet()
+
+
+def register(instance):
+    # The instance's _after_fork is called in the child process of a fork,
+    # to drop the locks and connections inherited from the parent.
+    _instances.add(instance)
+
+
+def after_fork_in_child():
+    for instance in list(_instances):
+        instance._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork_in_child)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from alf import forks
+from alf.adapters import release_response
+from alf.retries import RetryBudget
+from alf.tokens import monotonic
+
+
+HEDGED_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class HedgePolicy(object):
+
+    # A second attempt is sent when the first hasn't answered after delay
+    # seconds, or, without delay, the percentile of the latencies observed.
+    # Hedges are limited by a budget to a ratio of the requests.
+
+    RECALC_INTERVAL = 50
+
+    def __init__(self, delay=None, percentile=95, min_delay=0.005,
+                 max_delay=1, sample_size=1000, methods=HEDGED_METHODS,
+                 budget=None, max_workers=20):
+        self._delay = delay
+        self._percentile = percentile
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._latencies = deque(maxlen=sample_size)
+        self._observed = 0
+        self._adaptive_delay = max_delay
+        self.methods = frozenset(method.upper() for method in methods)
+        self.budget = budget if budget is not None \
+            else RetryBudget(ratio=0.05, min_retries=0)
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def is_hedged_method(self, method):
+        return method.upper() in self.methods
+
+    def delay(self):
+        if self._delay is not None:
+            return self._delay
+        return self._adaptive_delay
+
+    def observe(self, latency):
+        if self._delay is not None:
+            return
+
+        with self._lock:
+            self._latencies.append(latency)
+            self._observed += 1
+            # Sorting the samples on every request would cost more than the
+            # request itself.
+            if self._observed % self.RECALC_INTERVAL:
+                return
+            latencies = sorted(self._latencies)
+
+        index = min(len(latencies) - 1,
+                    int(len(latencies) * self._percentile / 100.0))
+        self._adaptive_delay = min(self._max_delay,
+                                   max(self._min_delay, latencies[index]))
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers)
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def discard(future):
+    # The losing attempt is cancelled if it hasn't started, or its response
+    # is released once it arrives.
+    if future.cancel():
+        return
+
+    def close(future):
+        if not future.cancelled() and future.exception() is None:
+            release_response(future.result())
+
+    future.add_done_callback(close)
+
+
+def first_result(futures):
+    # The first attempt answering wins; an error only wins when both
+    # attempts have failed.
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in [future for future in futures if future in done]:
+            if future.exception() is None:
+                for other in futures:
+                    if other is not future:
+                        discard(other)
+                return future
+            error = error or future
+    return error
@@ -1,67 +1,363 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+
 import requests
 
-from alf.tokens import Token, TokenError, TokenStorage
-from alf.adapters import mount_retry_adapter
+from alf.tokens import Token, TokenError, TokenStorage, monotonic
+from alf import forks
+from alf.adapters import mount_retry_adapter, reset_pools
+from alf.claims import jwt_expires_in
+from alf.deadlines import acquired
+from alf.metrics import (NULL_METRICS, TOKEN_CACHE_HITS, TOKEN_CACHE_MISSES,
+                         TOKEN_ERRORS, TOKEN_FETCH_SECONDS)
+
+
+def normalize_scope(scope):
+    if not scope:
+        return frozenset()
+    if isinstance(scope, (str, bytes)) or not hasattr(scope, '__iter__'):
+        scope = str(scope).split()
+    return frozenset(scope)
 
 
 class TokenManager(object):
 
+    TOKEN_LEASE_POLL_INTERVAL = 0.05
+    TOKEN_STALE_RETRY_INTERVAL = 1
+
     def __init__(self, token_endpoint, client_id, client_secret,
                  token_storage=None, token_retries=None,
-                 token_request_params=None):
+                 token_request_params=None, token_refresh_ratio=None,
+                 token_refresh_margin=None, token_lease_ttl=None,
+                 token_sync_interval=None, token_circuit_breaker=None,
+                 token_grace_period=None, token_jwt_expiry=False,
+                 token_clock_skew=0, metrics=None, pool_options=None,
+                 session=None, scope=None, audience=None):
         self._token_endpoint = token_endpoint
         self._client_id = client_id
         self._client_secret = client_secret
+        self._scope = normalize_scope(scope)
+        self._audience = audience
         self._token_request_params = token_request_params or {}
-        self._token_storage = TokenStorage(token_storage, self._get_cache_key())
-        self._session = requests.Session()
+        self._token_refresh_ratio = token_refresh_ratio
+        self._token_refresh_margin = token_refresh_margin
+        self._token_lease_ttl = token_lease_ttl
+        self._token_sync_interval = token_sync_interval
+        self._token_circuit_breaker = token_circuit_breaker
+        self._token_grace_period = token_grace_period
+        self._token_jwt_expiry = token_jwt_expiry
+        self._token_clock_skew = token_clock_skew
+        self._metrics = metrics or NULL_METRICS
+        self._token_storage = TokenStorage(token_storage,
+                                           self._get_storage_key(),
+                                           self._metrics)
+        self._session = session or requests.Session()
 
-        if token_retries is not None:
+        if session is None and (token_retries is not None or pool_options):
             self._token_retries = token_retries
-            mount_retry_adapter(self._session, token_retries)
+            mount_retry_adapter(self._session, token_retries,
+                                **(pool_options or {}))
 
         self._token = Token()
+        self._lock = threading.Lock()
+        self._refresh_on = None
+        self._refreshing = False
+        self._refresh_thread = None
+        self._sync_on = None
+        self._scoped_managers = {}
+        self._scoped_lock = threading.Lock()
+        self._owns_session = session is None
+        forks.register(self)
+
+    def _after_fork(self):
+        # The token is kept, so the child process doesn't request another
+        # one; the locks may have been held by threads that don't exist in
+        # the child.
+        self._lock = threading.Lock()
+        self._scoped_lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_thread = None
+        if self._owns_session:
+            reset_pools(self._session)
+
+    @staticmethod
+    def cache_key(token_endpoint, client_id):
+        return '{}_{}'.format(token_endpoint, client_id)
 
     def _get_cache_key(self):
-        return '{}_{}'.format(self._token_endpoint, self._client_id)
+        return self.cache_key(self._token_endpoint, self._client_id)
+
+    def _get_storage_key(self):
+        key = self._get_cache_key()
+        if self._scope:
+            key = '{}_{}'.format(key, ' '.join(sorted(self._scope)))
+        if self._audience is not None:
+            key = '{}_{}'.format(key, self._audience)
+        return key
+
+    def for_scope(self, scope=None, audience=None):
+        scope = normalize_scope(scope)
+        if not scope and audience is None:
+            return self
+
+        with self._scoped_lock:
+            manager = self._scoped_managers.get((scope, audience))
+            if manager is not None and manager._has_token():
+                return manager
+
+            # A valid token of a broader scope is reused instead of
+            # requesting a token for each scope.
+            for (other_scope, other_audience), other_manager \
+                    in self._scoped_managers.items():
+                if other_audience == audience and other_scope > scope \
+                        and other_manager._has_token():
+                    return other_manager
+
+            if manager is None:
+                manager = self._create_scoped_manager(scope, audience)
+                self._scoped_managers[(scope, audience)] = manager
+            return manager
+
+    def _create_scoped_manager(self, scope, audience):
+        return self.__class__(
+            token_endpoint=self._token_endpoint,
+            client_id=self._client_id,
+            client_secret=self._client_secret,
+            token_storage=self._token_storage._storage,
+            token_request_params=self._token_request_params,
+            token_refresh_ratio=self._token_refresh_ratio,
+            token_refresh_margin=self._token_refresh_margin,
+            token_lease_ttl=self._token_lease_ttl,
+            token_sync_interval=self._token_sync_interval,
+            token_circuit_breaker=self._token_circuit_breaker,
+            token_grace_period=self._token_grace_period,
+            token_jwt_expiry=self._token_jwt_expiry,
+            token_clock_skew=self._token_clock_skew,
+            metrics=self._metrics,
+            session=self._session,
+            scope=scope,
+            audience=audience)
 
     def _has_token(self):
         return self._token.is_valid()
 
-    def get_token(self):
-        if not self._has_token():
-            self._update_token()
+    def get_token(self, deadline=None):
+        token = self._token
+        if self._token_sync_interval is not None and self._needs_sync():
+            token = self._sync_token()
+        if token.is_valid():
+            if self._metrics.enabled:
+                self._metrics.increment(TOKEN_CACHE_HITS, source='memory')
+            if self._refresh_on is not None and self._needs_refresh():
+                self._refresh_in_background()
+            return token.access_token
+
+        if self._token_grace_period and self._is_stale(token):
+            # The expired token is still served while a new one is
+            # requested in background.
+            if self._refresh_on is None or self._needs_refresh():
+                self._refresh_in_background()
+            return token.access_token
+
+        # With a deadline, the wait for another thread requesting the token
+        # is bounded too.
+        with acquired(self._lock, deadline):
+            if not self._has_token():
+                self._update_token(deadline=deadline)
+
+            return self._token.access_token
+
+    def _needs_sync(self):
+        sync_on = self._sync_on
+        return sync_on is None or sync_on <= monotonic()
+
+    def _sync_token(self):
+        # Drops the token when another process has invalidated it on the
+        # storage, instead of waiting for the resource to reject it.
+        with self._lock:
+            if self._needs_sync():
+                self._sync_on = monotonic() + self._token_sync_interval
+                if self._token_storage.is_invalidated():
+                    self._token = Token()
+                    self._refresh_on = None
+            return self._token
+
+    def _is_stale(self, token):
+        return bool(token.access_token) \
+            and token.expires_in() > -self._token_grace_period
 
-        return self._token.access_token
+    def _needs_refresh(self):
+        refresh_on = self._refresh_on
+        return refresh_on is not None and refresh_on <= monotonic()
 
-    def _get_token_data(self):
+    def _calc_refresh_on(self, token):
+        if self._token_refresh_ratio is None \
+                and self._token_refresh_margin is None:
+            return None
+
+        lifetime = token.expires_in()
+        refresh_in = lifetime
+        if self._token_refresh_ratio is not None:
+            refresh_in = min(refresh_in,
+                             lifetime * self._token_refresh_ratio)
+        if self._token_refresh_margin is not None:
+            refresh_in = min(refresh_in,
+                             lifetime - self._token_refresh_margin)
+        return monotonic() + refresh_in
+
+    def _refresh_in_background(self):
+        if not self._lock.acquire(False):
+            return
+
+        try:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._refresh_thread = threading.Thread(target=self._refresh_token)
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+        finally:
+            self._lock.release()
+
+    def _refresh_token(self):
+        try:
+            with self._lock:
+                token = self._token
+                if self._has_token() and self._needs_refresh() \
+                        or self._token_grace_period and self._is_stale(token):
+                    try:
+                        self._update_token(min_expires_on=token.expires_on)
+                    except (TokenError, requests.RequestException):
+                        if token.is_valid():
+                            # The current token is still valid, try again
+                            # halfway to its expiration.
+                            self._refresh_on = \
+                                monotonic() + token.expires_in() / 2
+                        else:
+                            self._refresh_on = \
+                                monotonic() + self.TOKEN_STALE_RETRY_INTERVAL
+        finally:
+            self._refreshing = False
+
+    def _get_token_data(self, min_expires_on=None, deadline=None):
+        token_data = self._get_stored_token_data(min_expires_on)
+        if token_data:
+            self._metrics.increment(TOKEN_CACHE_HITS, source='storage')
+        else:
+            self._metrics.increment(TOKEN_CACHE_MISSES)
+            if self._token_lease_ttl:
+                token_data = self._request_token_data_with_lease(
+                    min_expires_on, deadline)
+            else:
+                token_data = self._request_token_data(deadline)
+        return token_data
+
+    def _get_stored_token_data(self, min_expires_on=None):
         token_data = self._token_storage.request_token()
-        if not token_data:
-            token_data = self._request_token()
-            expires_in = token_data.get('expires_in', 0)
-            token_data['expires_on'] = Token.calc_expires_on(expires_in)
+        if min_expires_on is not None and token_data \
+                and token_data['expires_on'] <= min_expires_on:
+            return dict()
         return token_data
 
-    def reset_token(self):
-        self._token = Token()
-        self._token_storage(self._token)
+    def _request_token_data(self, deadline=None):
+        try:
+            with self._metrics.timer(TOKEN_FETCH_SECONDS):
+                token_data = self._request_token(deadline)
+        except TokenError:
+            self._metrics.increment(TOKEN_ERRORS)
+            raise
+        expires_in = token_data.get('expires_in', 0)
+        if self._token_jwt_expiry:
+            # The exp claim of JWT access tokens is used instead of
+            # expires_in, which some providers leave out.
+            claims_expires_in = jwt_expires_in(
+                token_data.get('access_token'), self._token_clock_skew)
+            if claims_expires_in is not None:
+                expires_in = claims_expires_in
+        token_data['expires_on'] = Token.calc_expires_on(expires_in)
+        return token_data
 
-    def _update_token(self):
-        token_data = self._get_token_data()
+    def _request_token_data_with_lease(self, min_expires_on=None,
+                                       deadline=None):
+        # Only the process holding the lease requests a token, the others
+        # wait for it on the storage until the lease expires.
+        lease_expires = monotonic() + self._token_lease_ttl
+        while monotonic() < lease_expires:
+            if deadline is not None:
+                deadline.check()
+            if self._token_storage.acquire_lease(self._token_lease_ttl):
+                try:
+                    token_data = self._get_stored_token_data(min_expires_on)
+                    if not token_data:
+                        token_data = self._request_token_data(deadline)
+                        self._token_storage(Token(
+                            token_data.get('access_token', ''),
+                            token_data['expires_on']))
+                    return token_data
+                finally:
+                    self._token_storage.release_lease()
+
+            time.sleep(self.TOKEN_LEASE_POLL_INTERVAL)
+            token_data = self._get_stored_token_data(min_expires_on)
+            if token_data:
+                return token_data
+
+        return self._request_token_data(deadline)
+
+    def reset_token(self, access_token=None):
+        with self._lock:
+            if access_token is not None \
+                    and access_token != self._token.access_token:
+                # The rejected token has already been replaced.
+                return
+
+            token_data = self._token_storage.invalidate(
+                self._token.access_token)
+            if token_data:
+                self._set_token(token_data)
+            else:
+                self._token = Token()
+                self._refresh_on = None
+
+    def _update_token(self, min_expires_on=None, deadline=None):
+        self._set_token(self._get_token_data(min_expires_on, deadline))
+
+    def _set_token(self, token_data):
         access_token = token_data.get('access_token', '')
         expires_on = token_data.get('expires_on', 0)
-        self._token = Token(access_token,
-                            expires_on)
-        self._token_storage(self._token)
+        token = Token(access_token, expires_on)
+        self._token_storage(token)
+        self._refresh_on = self._calc_refresh_on(token)
+        self._token = token
+
+    def _get_token_request_data(self):
+        data = {'grant_type': 'client_credentials'}
+        if self._scope:
+            data['scope'] = ' '.join(sorted(self._scope))
+        if self._audience is not None:
+            data['audience'] = self._audience
+        return data
+
+    def _request_token(self, deadline=None):
+        if self._token_circuit_breaker is not None:
+            return self._token_circuit_breaker.call(self._post_token_request,
+                                                    deadline)
+        return self._post_token_request(deadline)
+
+    def _post_token_request(self, deadline=None):
+        timeout = self._token_request_params.get('timeout')
+        if deadline is not None:
+            # The token request and its token_retries only get the time
+            # left of the call.
+            timeout = deadline.timeout(timeout)
 
-    def _request_token(self):
         response = self._session.post(
             self._token_endpoint,
-            data={'grant_type': 'client_credentials'},
+            data=self._get_token_request_data(),
             auth=(self._client_id, self._client_secret),
-            timeout=self._token_request_params.get('timeout'))
+            timeout=timeout)
 
         if not response.ok:
             raise TokenError('Failed to request token', response)
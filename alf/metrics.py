@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from alf import forks
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+
+TOKEN_CACHE_HITS = 'alf_token_cache_hits_total'
+TOKEN_CACHE_MISSES = 'alf_token_cache_misses_total'
+TOKEN_FETCH_SECONDS = 'alf_token_fetch_seconds'
+TOKEN_ERRORS = 'alf_token_errors_total'
+TOKEN_STORAGE_SECONDS = 'alf_token_storage_seconds'
+UNAUTHORIZED_RETRIES = 'alf_unauthorized_retries_total'
+RESOURCE_RETRIES = 'alf_resource_retries_total'
+RETRY_BUDGET_REJECTIONS = 'alf_retry_budget_rejections_total'
+HEDGED_REQUESTS = 'alf_hedged_requests_total'
+HEDGE_WINS = 'alf_hedge_wins_total'
+RESPONSE_CACHE_HITS = 'alf_response_cache_hits_total'
+RESPONSE_CACHE_MISSES = 'alf_response_cache_misses_total'
+DISCARDED_RESPONSES = 'alf_discarded_responses_total'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Timer(object):
+
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self._started = None
+
+    def __enter__(self):
+        self._started = monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.observe(self._name, monotonic() - self._started,
+                              **self._labels)
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class NullMetrics(object):
+
+    # The token cache hit is counted only when enabled, so the hot path
+    # doesn't even call the collector when metrics are off.
+    enabled = False
+
+    def increment(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return NULL_TIMER
+
+
+NULL_METRICS = NullMetrics()
+
+
+class InMemoryMetrics(object):
+
+    enabled = True
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = \
+                    [[0] * len(self._buckets), 0, 0]
+            for index, bucket in enumerate(self._buckets):
+                if value <= bucket:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def counter(self, name, **labels):
+        return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        histogram = self._histograms.get(self._key(name, labels))
+        if histogram is None:
+            return {'buckets': {}, 'sum': 0, 'count': 0}
+        return {'buckets': dict(zip(self._buckets, histogram[0])),
+                'sum': histogram[1], 'count': histogram[2]}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def export(self):
+        # Prometheus text exposition format.
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(buckets), total, count))
+                for key, (buckets, total, count) in self._histograms.items())
+
+        lines = []
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append('# TYPE {} counter'.format(name))
+            lines.append('{}{} {}'.format(
+                name, _format_labels(labels), _format_value(value)))
+
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in described:
+                described.add(name)
+                lines.append('# TYPE {} histogram'.format(name))
+            for bucket, value in zip(self._buckets, buckets):
+                lines.append('{}_bucket{} {}'.format(
+                    name,
+                    _format_labels(labels + (('le', _format_value(bucket)),)),
+                    value))
+            lines.append('{}_bucket{} {}'.format(
+                name, _format_labels(labels + (('le', '+Inf'),)), count))
+            lines.append('{}_sum{} {}'.format(
+                name, _format_labels(labels), _format_value(total)))
+            lines.append('{}_count{} {}'.format(
+                name, _format_labels(labels), count))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
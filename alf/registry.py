@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+import requests
+
+from alf import forks
+from alf.managers import TokenManager
+from alf.tokens import monotonic
+
+
+class TokenManagerRegistry(object):
+
+    def __init__(self, token_manager_class=TokenManager, max_size=None,
+                 ttl=None, session=None, **token_manager_kwargs):
+        self._token_manager_class = token_manager_class
+        self._max_size = max_size
+        self._ttl = ttl
+        self._session = session or requests.Session()
+        self._token_manager_kwargs = token_manager_kwargs
+        self._managers = OrderedDict()
+        self._references = {}
+        self._lock = threading.Lock()
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._managers)
+
+    def __contains__(self, key):
+        return key in self._managers
+
+    def get(self, token_endpoint, client_id, client_secret,
+            **token_manager_kwargs):
+        key = self._token_manager_class.cache_key(token_endpoint, client_id)
+        with self._lock:
+            return self._get(key, token_endpoint, client_id, client_secret,
+                             token_manager_kwargs)
+
+    def acquire(self, token_endpoint, client_id, client_secret,
+                **token_manager_kwargs):
+        # Like get, but the manager is kept until each acquire is released.
+        key = self._token_manager_class.cache_key(token_endpoint, client_id)
+        with self._lock:
+            manager = self._get(key, token_endpoint, client_id,
+                                client_secret, token_manager_kwargs)
+            self._references[key] = self._references.get(key, 0) + 1
+            return manager
+
+    def release(self, token_endpoint, client_id):
+        key = self._token_manager_class.cache_key(token_endpoint, client_id)
+        with self._lock:
+            references = self._references.pop(key, 0) - 1
+            if references > 0:
+                self._references[key] = references
+            else:
+                self._managers.pop(key, None)
+
+    def _get(self, key, token_endpoint, client_id, client_secret,
+             token_manager_kwargs):
+        now = monotonic()
+        self._evict_expired(now)
+
+        entry = self._managers.pop(key, None)
+        if entry is None:
+            # The options of the first call are used, the manager is shared
+            # with the next ones.
+            kwargs = dict(self._token_manager_kwargs, **token_manager_kwargs)
+            manager = self._token_manager_class(
+                token_endpoint=token_endpoint,
+                client_id=client_id,
+                client_secret=client_secret,
+                session=self._session,
+                **kwargs)
+        else:
+            manager = entry[0]
+            manager._client_secret = client_secret
+
+        # The most recently used managers are kept at the end.
+        self._managers[key] = (manager, now)
+        self._evict_oldest()
+        return manager
+
+    def clear(self):
+        with self._lock:
+            self._managers.clear()
+            self._references.clear()
+
+    def _evict_expired(self, now):
+        if self._ttl is None:
+            return
+        while self._managers:
+            key, (manager, last_used) = next(iter(self._managers.items()))
+            if last_used + self._ttl > now:
+                break
+            del self._managers[key]
+            self._references.pop(key, None)
+
+    def _evict_oldest(self):
+        if self._max_size is None:
+            return
+        while len(self._managers) > self._max_size:
+            key, entry = self._managers.popitem(last=False)
+            self._references.pop(key, None)
+
+
+_shared_registries = {}
+_shared_registries_lock = threading.Lock()
+
+
+def shared_registry(token_manager_class=TokenManager):
+    # The process-wide registry of the clients created with
+    # share_token_manager=True.
+    with _shared_registries_lock:
+        registry = _shared_registries.get(token_manager_class)
+        if registry is None:
+            registry = _shared_registries[token_manager_class] = \
+                TokenManagerRegistry(token_manager_class=token_manager_class)
+        return registry
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+from alf import forks
+from alf.tokens import monotonic
+
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS',
+                                'TRACE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class RetryBudget(object):
+
+    # Retries are allowed while they are less than a ratio of the requests
+    # of the last window seconds, so they can't multiply the load when every
+    # request fails. min_retries allows some retries with little traffic.
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10):
+        self._ratio = ratio
+        self._min_retries = min_retries
+        self._window = window
+        self._slots = [[None, 0, 0] for _ in range(window)]
+        self._hosts = {}
+        self._lock = threading.Lock()
+        forks.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _slot(self, now):
+        second = int(now)
+        slot = self._slots[second % self._window]
+        if slot[0] != second:
+            slot[:] = [second, 0, 0]
+        return slot
+
+    def _totals(self, now):
+        oldest = int(now) - self._window
+        requests = retries = 0
+        for second, slot_requests, slot_retries in self._slots:
+            if second is not None and second > oldest:
+                requests += slot_requests
+                retries += slot_retries
+        return requests, retries
+
+    def _host_stats(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {'retries': 0, 'rejected': 0}
+        return stats
+
+    def record_request(self):
+        with self._lock:
+            self._slot(monotonic())[1] += 1
+
+    def withdraw(self, host=None):
+        now = monotonic()
+        with self._lock:
+            requests, retries = self._totals(now)
+            if retries >= max(self._min_retries, self._ratio * requests):
+                self._host_stats(host)['rejected'] += 1
+                return False
+
+            self._slot(now)[2] += 1
+            self._host_stats(host)['retries'] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return dict((host, dict(stats))
+                        for host, stats in self._hosts.items())
+
+
+default_budget = RetryBudget()
+
+
+class ResourceRetry(object):
+
+    def __init__(self, total=3, backoff_factor=0.1, max_backoff=10,
+                 statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS,
+                 respect_retry_after=True, max_retry_after=60, budget=None):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.budget = budget if budget is not None else default_budget
+
+    @classmethod
+    def from_value(cls, retries):
+        if retries is None or isinstance(retries, cls):
+            return retries
+        return cls(total=retries)
+
+    def is_retryable_method(self, method):
+        return method.upper() in self.methods
+
+    def is_retryable(self, response=None, error=None):
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError,
+                                      requests.Timeout))
+        return response.status_code in self.statuses
+
+    def backoff(self, attempt, response=None):
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return retry_after
+
+        # Full jitter: a random wait up to the exponential backoff, so
+        # clients failing together don't retry together.
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def retry_after(self, response):
+        if response is None or not self.respect_retry_after:
+            return None
+
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, email.utils.mktime_tz(date) - time.time())
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+replace = getattr(os, 'replace', os.rename)
+
+
+def default_path():
+    return os.path.join(tempfile.gettempdir(), 'alf-tokens-{}.json'.format(
+        os.getuid() if hasattr(os, 'getuid') else os.getpid()))
+
+
+class FileTokenStorage(object):
+
+    # Shares tokens between the processes of a host through a file. Writes
+    # replace the whole file atomically, holding an flock on a lock file so
+    # concurrent writes don't drop each other's keys. Reads are only a stat
+    # while the file doesn't change.
+
+    def __init__(self, path=None):
+        self._path = path or default_path()
+        self._lock_path = self._path + '.lock'
+        self._cache = (None, {})
+
+    def get(self, key):
+        entry = self._read().get(key)
+        if entry is None or self._is_expired(entry):
+            return None
+        return entry[0]
+
+    def set(self, key, value, timeout=None):
+        with self._locked():
+            values = self._load()
+            values[key] = self._entry(value, timeout)
+            self._write(values)
+
+    def setex(self, key, timeout, value):
+        self.set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        with self._locked():
+            values = self._load()
+            entry = values.get(key)
+            if entry is not None and not self._is_expired(entry):
+                return False
+            values[key] = self._entry(value, timeout)
+            self._write(values)
+            return True
+
+    def delete(self, key):
+        with self._locked():
+            values = self._load()
+            if values.pop(key, None) is not None:
+                self._write(values)
+
+    @staticmethod
+    def _entry(value, timeout):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return [value, time.time() + timeout if timeout else None]
+
+    @staticmethod
+    def _is_expired(entry):
+        return entry[1] is not None and entry[1] <= time.time()
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return (stat.st_ino, getattr(stat, 'st_mtime_ns', stat.st_mtime),
+                stat.st_size)
+
+    def _read(self):
+        stat_key, values = self._cache
+        current_key = self._stat_key()
+        if current_key is not None and current_key == stat_key:
+            return values
+        return self._load()
+
+    def _load(self):
+        stat_key = self._stat_key()
+        try:
+            with open(self._path) as token_file:
+                values = json.load(token_file)
+        except (IOError, OSError, ValueError):
+            values = {}
+        self._cache = (stat_key, values)
+        return dict(values)
+
+    def _write(self, values):
+        now = time.time()
+        values = dict((key, entry) for key, entry in values.items()
+                      if entry[1] is None or entry[1] > now)
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        descriptor, temp_path = tempfile.mkstemp(dir=directory,
+                                                 prefix='.alf-tokens-')
+        try:
+            with os.fdopen(descriptor, 'w') as temp_file:
+                json.dump(values, temp_file)
+            replace(temp_path, self._path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        self._cache = (self._stat_key(), values)
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+
+        # The lock file is opened on each write: flock is held by the open
+        # file, which a forked process would otherwise share.
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
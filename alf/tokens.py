@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
+import math
+import time
+import uuid
 from datetime import datetime, timedelta
 
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+from alf.metrics import NULL_METRICS, TOKEN_STORAGE_SECONDS
+
 
 class TokenError(Exception):
 
@@ -11,12 +21,21 @@ class TokenError(Exception):
 
 class Token(object):
 
+    # The expiration is tracked on the monotonic clock, expires_on is the
+    # wall clock time used to share the token on storages.
+    __slots__ = ('access_token', 'expires_on', '_expires_at')
+
     def __init__(self, access_token='', expires_on=0):
         self.access_token = access_token
         self.expires_on = expires_on or self.calc_expires_on()
+        self._expires_at = monotonic() + \
+            (self.expires_on - datetime.now()).total_seconds()
 
     def is_valid(self):
-        return self.expires_on > datetime.now()
+        return self._expires_at > monotonic()
+
+    def expires_in(self):
+        return self._expires_at - monotonic()
 
     @staticmethod
     def calc_expires_on(expires_in=0):
@@ -26,12 +45,20 @@ class Token(object):
 class TokenStorage(object):
 
     TOKEN_EXPIRES_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+    RECORD_SEPARATOR = '|'
 
-    def __init__(self, custom_storage=None, base_key=None):
+    def __init__(self, custom_storage=None, base_key=None, metrics=None):
         self._access_token = ''
         self._expires_on = ''
         self._base_key = str(base_key)
+        self._lease_owner = None
+        self._generation = None
         self._storage = custom_storage or TokenDefaultStorage()
+        self._metrics = metrics or NULL_METRICS
+
+    @property
+    def record_key(self):
+        return "{}_{}".format(self._base_key, 'token')
 
     @property
     def token_key(self):
@@ -41,30 +68,163 @@ class TokenStorage(object):
     def expires_key(self):
         return "{}_{}".format(self._base_key, 'expires_on')
 
+    @property
+    def generation_key(self):
+        return "{}_{}".format(self._base_key, 'generation')
+
+    @property
+    def lease_key(self):
+        return "{}_{}".format(self._base_key, 'lease')
+
     def __call__(self, token):
         if token.access_token != self._access_token \
                 or token.expires_on != self._expires_on:
             self._access_token = token.access_token
             self._expires_on = token.expires_on
-            self._storage.set(self.token_key, token.access_token)
-            self._storage.set(
-                self.expires_key,
-                token.expires_on.strftime(self.TOKEN_EXPIRES_FORMAT)
-            )
+            ttl = (token.expires_on - datetime.now()).total_seconds()
+            with self._metrics.timer(TOKEN_STORAGE_SECONDS, operation='set'):
+                self._set(self.record_key, self.encode(token), ttl)
 
     def request_token(self):
-        self._access_token = self._storage.get(self.token_key)
-        expires_on = self._storage.get(self.expires_key)
-        if expires_on:
-            self._expires_on = datetime.strptime(expires_on,
-                                                 self.TOKEN_EXPIRES_FORMAT)
-        else:
-            self._expires_on = datetime.now()
+        with self._metrics.timer(TOKEN_STORAGE_SECONDS, operation='get'):
+            access_token, expires_on = self._get_token()
+        self._access_token = access_token
+        self._expires_on = expires_on or datetime.now()
         if self._access_token and self._expires_on > datetime.now():
             return {'access_token': self._access_token,
                     'expires_on': self._expires_on}
         return dict()
 
+    def invalidate(self, access_token):
+        token_data = self.request_token()
+        if token_data and token_data['access_token'] != access_token:
+            # Another process has already replaced the rejected token.
+            return token_data
+
+        if token_data:
+            self._generation = uuid.uuid4().hex
+            self._storage.set(self.generation_key, self._generation)
+            self(Token())
+        return dict()
+
+    def is_invalidated(self):
+        generation = self._storage.get(self.generation_key) or ''
+        if isinstance(generation, bytes):
+            generation = generation.decode('utf-8')
+        invalidated = self._generation is not None \
+            and generation != self._generation
+        self._generation = generation
+        return invalidated
+
+    @classmethod
+    def encode(cls, token):
+        expires_on = token.expires_on
+        expires_at = int(time.mktime(expires_on.timetuple())) * 1000000 \
+            + expires_on.microsecond
+        return '{}{}{}'.format(
+            expires_at, cls.RECORD_SEPARATOR, token.access_token)
+
+    @classmethod
+    def decode(cls, record):
+        if isinstance(record, bytes):
+            record = record.decode('utf-8')
+        expires_at, _, access_token = record.partition(cls.RECORD_SEPARATOR)
+        expires_on = datetime.fromtimestamp(int(expires_at) // 1000000) \
+            + timedelta(microseconds=int(expires_at) % 1000000)
+        return access_token, expires_on
+
+    def _get_token(self):
+        keys = [self.record_key, self.token_key, self.expires_key]
+        if self._has_get_many():
+            record, access_token, expires_on = self._get_many(keys)
+        else:
+            record = self._storage.get(self.record_key)
+            if not record:
+                access_token, expires_on = self._get_many(keys[1:])
+
+        if record:
+            return self.decode(record)
+
+        # Tokens stored on separate keys by previous versions.
+        if isinstance(access_token, bytes):
+            access_token = access_token.decode('utf-8')
+        if isinstance(expires_on, bytes):
+            expires_on = expires_on.decode('utf-8')
+        if expires_on:
+            expires_on = datetime.strptime(expires_on,
+                                           self.TOKEN_EXPIRES_FORMAT)
+        return access_token, expires_on
+
+    def _has_get_many(self):
+        return hasattr(self._storage, 'mget') \
+            or hasattr(self._storage, 'get_multi') \
+            or hasattr(self._storage, 'get_many')
+
+    def _get_many(self, keys):
+        if hasattr(self._storage, 'mget'):
+            return list(self._storage.mget(keys))
+        if hasattr(self._storage, 'get_multi'):
+            values = self._storage.get_multi(keys)
+            return [values.get(key) for key in keys]
+        if hasattr(self._storage, 'get_many'):
+            values = self._storage.get_many(keys)
+            return [values.get(key) for key in keys]
+        return [self._storage.get(key) for key in keys]
+
+    def _set(self, key, value, ttl):
+        # Storages supporting expiration drop the token by themselves:
+        # Redis through setex and caches with add (Memcache, Django) through
+        # the timeout argument of set.
+        ttl = max(int(math.ceil(ttl)), 1)
+        if hasattr(self._storage, 'setex'):
+            self._storage.setex(key, ttl, value)
+        elif hasattr(self._storage, 'add'):
+            self._storage.set(key, value, ttl)
+        else:
+            self._storage.set(key, value)
+
+    def acquire_lease(self, ttl):
+        self._lease_owner = uuid.uuid4().hex
+        expires = time.time() + ttl
+        value = '{}:{}'.format(self._lease_owner, expires)
+        ttl = int(math.ceil(ttl))
+
+        if hasattr(self._storage, 'add'):
+            return bool(self._storage.add(self.lease_key, value, ttl))
+
+        if hasattr(self._storage, 'setnx'):
+            return bool(self._storage.set(self.lease_key, value,
+                                          nx=True, ex=ttl))
+
+        # Storages with only get/set have no atomic set-if-absent, the lease
+        # is read back to check that no other process has overwritten it.
+        owner, lease_expires = self._get_lease()
+        if owner and lease_expires > time.time():
+            return False
+
+        self._storage.set(self.lease_key, value)
+        owner, lease_expires = self._get_lease()
+        return owner == self._lease_owner
+
+    def release_lease(self):
+        owner, lease_expires = self._get_lease()
+        if owner != self._lease_owner:
+            return
+
+        if hasattr(self._storage, 'delete'):
+            self._storage.delete(self.lease_key)
+        else:
+            self._storage.set(self.lease_key, '')
+
+    def _get_lease(self):
+        value = self._storage.get(self.lease_key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        if not value:
+            return None, 0
+        owner, _, expires = value.partition(':')
+        return owner, float(expires)
+
 
 class TokenDefaultStorage(object):
 
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Per-request overhead of alf on a valid token.
+
+Requests are sent to an adapter answering without network access, so the
+results show the cost of the token check and of the authorization header.
+
+    python -m benchmarks.hot_path [number]
+"""
+import sys
+import timeit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from alf.auth import BearerTokenAuth
+from alf.client import Client
+from alf.tokens import Token
+
+
+class StubAdapter(BaseAdapter):
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+def build_client():
+    client = Client(
+        token_endpoint='http://localhost/token',
+        client_id='client-id',
+        client_secret='secret')
+    client._token_manager._token = Token(
+        'access_token', Token.calc_expires_on(3600))
+    client.mount('http://', StubAdapter())
+    return client
+
+
+def main(number=100000):
+    client = build_client()
+    token = client._token_manager._token
+    request = requests.Request(
+        'GET', 'http://localhost/resource').prepare()
+    benchmarks = [
+        ('Token.is_valid', token.is_valid),
+        ('TokenManager.get_token', client._token_manager.get_token),
+        ('new BearerTokenAuth', lambda: BearerTokenAuth(
+            token.access_token)(request)),
+        ('Client._get_auth', lambda: client._get_auth(
+            token.access_token)(request)),
+        ('Client.get', lambda: client.get('http://localhost/resource')),
+    ]
+
+    for name, function in benchmarks:
+        runs = number if name != 'Client.get' else number // 10
+        best = min(timeit.repeat(function, number=runs, repeat=5))
+        print('{:<24} {:>10.3f} us/call'.format(name, best / runs * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
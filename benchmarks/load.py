@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Throughput and latency of alf against local stub servers.
+
+A stub token endpoint and resource server are started on localhost, with
+configurable latency, error rate and token lifetime, and the client is driven
+from threads, processes or asyncio.
+
+    python -m benchmarks.load --mode threads --concurrency 8 --requests 5000
+    python -m benchmarks.load --mode processes --expires-in 1
+    python -m benchmarks.load --mode asyncio --latency 0.01
+"""
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from alf.client import Client
+from benchmarks.servers import StubServer
+
+MODES = ('threads', 'processes', 'asyncio')
+
+
+class CountingStorage(object):
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def get(self, key):
+        with self._lock:
+            self.calls += 1
+        return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self.calls += 1
+        self._values[key] = value
+
+
+def _client_kwargs(server, storage):
+    return {
+        'token_endpoint': server + '/token',
+        'client_id': 'client-id',
+        'client_secret': 'secret',
+        'token_storage': storage,
+    }
+
+
+def _timed(function, latencies):
+    started = time.perf_counter()
+    try:
+        ok = function().status_code < 400
+    except Exception:
+        ok = False
+    latencies.append(time.perf_counter() - started)
+    return ok
+
+
+def run_threads(server, requests, concurrency):
+    storage = CountingStorage()
+    client = Client(pool_maxsize=concurrency,
+                    **_client_kwargs(server, storage))
+    url = server + '/resource'
+    latencies = []
+
+    def worker(count):
+        return sum(not _timed(lambda: client.get(url), latencies)
+                   for _ in range(count))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        errors = sum(executor.map(worker, _split(requests, concurrency)))
+    client.close()
+    return latencies, errors, storage.calls
+
+
+def _process_worker(args):
+    server, count = args
+    return run_threads(server, count, 1)
+
+
+def run_processes(server, requests, concurrency):
+    latencies, errors, storage_calls = [], 0, 0
+    with multiprocessing.Pool(concurrency) as pool:
+        results = pool.map(_process_worker, [
+            (server, count) for count in _split(requests, concurrency)])
+
+    for worker_latencies, worker_errors, worker_storage_calls in results:
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+        storage_calls += worker_storage_calls
+    return latencies, errors, storage_calls
+
+
+def run_asyncio(server, requests, concurrency):
+    from alf.aio import AsyncClient
+
+    async def main():
+        storage = CountingStorage()
+        client = AsyncClient(**_client_kwargs(server, storage))
+        url = server + '/resource'
+        latencies = []
+
+        async def worker(count):
+            errors = 0
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    errors += response.status_code >= 400
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+            return errors
+
+        try:
+            errors = await asyncio.gather(*[
+                worker(count) for count in _split(requests, concurrency)])
+        finally:
+            await client.close()
+        return latencies, sum(errors), storage.calls
+
+    return asyncio.run(main())
+
+
+def _split(total, parts):
+    return [total // parts + (index < total % parts)
+            for index in range(parts)]
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(percent / 100.0 * len(values)))]
+
+
+def run(mode='threads', requests=2000, concurrency=8, latency=0,
+        error_rate=0, token_latency=0, token_error_rate=0, expires_in=3600):
+    server = StubServer.start(
+        latency=latency, error_rate=error_rate, token_latency=token_latency,
+        token_error_rate=token_error_rate, expires_in=expires_in)
+    runner = {'threads': run_threads, 'processes': run_processes,
+              'asyncio': run_asyncio}[mode]
+    try:
+        started = time.perf_counter()
+        latencies, errors, storage_calls = runner(
+            server.url, requests, concurrency)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'token_calls': server.token_calls,
+        'storage_calls': storage_calls,
+    }
+
+
+def report(result):
+    print('{mode:<10} {requests:>7} requests {errors:>5} errors '
+          '{rps:>9.1f} req/s  p50 {p50_ms:>7.2f} ms  p99 {p99_ms:>7.2f} ms  '
+          '{token_calls:>4} token calls {storage_calls:>6} storage calls'
+          .format(**result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=MODES + ('all',), default='all')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds the resource server waits')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='share of resource requests answered with 503')
+    parser.add_argument('--token-latency', type=float, default=0)
+    parser.add_argument('--token-error-rate', type=float, default=0)
+    parser.add_argument('--expires-in', type=int, default=3600,
+                        help='lifetime of the tokens issued, in seconds')
+    args = parser.parse_args(argv)
+
+    modes = MODES if args.mode == 'all' else (args.mode,)
+    for mode in modes:
+        report(run(mode, requests=args.requests,
+                   concurrency=args.concurrency, latency=args.latency,
+                   error_rate=args.error_rate,
+                   token_latency=args.token_latency,
+                   token_error_rate=args.token_error_rate,
+                   expires_in=args.expires_in))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Local stub token endpoint and resource server for the benchmarks."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are sent together, without waiting for delayed ACKs.
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+
+        server = self.server
+        if self.path == '/token':
+            return self._token(server)
+        self._resource(server)
+
+    def _token(self, server):
+        with server.lock:
+            server.token_calls += 1
+            access_token = 'token-{}'.format(server.token_calls)
+        time.sleep(server.token_latency)
+
+        if random.random() < server.token_error_rate:
+            return self._reply(503, {'error': 'unavailable'})
+        self._reply(200, {'access_token': access_token,
+                          'expires_in': server.expires_in})
+
+    def _resource(self, server):
+        with server.lock:
+            server.resource_calls += 1
+        time.sleep(server.latency)
+
+        if random.random() < server.error_rate:
+            return self._reply(503, {'error': 'unavailable'})
+        if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            return self._reply(401, {'error': 'unauthorized'})
+        self._reply(200, {'ok': True})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0, error_rate=0, token_latency=0,
+                 token_error_rate=0, expires_in=3600):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_latency = token_latency
+        self.token_error_rate = token_error_rate
+        self.expires_in = expires_in
+        self.token_calls = 0
+        self.resource_calls = 0
+
+    @classmethod
+    def start(cls, **kwargs):
+        server = cls(**kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
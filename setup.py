@@ -27,5 +27,9 @@ setup(
     include_package_data=True,
     install_requires=[
         'requests>=1.2.3',
+        'futures; python_version < "3"',
     ],
+    extras_require={
+        'aiohttp': ['aiohttp'],
+    },
 )
@@ -2,9 +2,13 @@
 
 from unittest import TestCase
 
+import requests
 from mock import Mock, patch
 
-from alf.adapters import mount_retry_adapter
+from alf.adapters import (KEEPALIVE_SOCKET_OPTIONS, KeepAliveAdapter,
+                          build_adapter, mount_retry_adapter, pool_stats,
+                          release_response)
+from tests.server import StubServer
 
 
 class MountRetryAdapterTestCase(TestCase):
@@ -23,3 +27,112 @@ class MountRetryAdapterTestCase(TestCase):
 
         session.mount.assert_any_call('http://', adapter)
         session.mount.assert_any_call('https://', adapter)
+
+    @patch('requests.adapters.HTTPAdapter')
+    def test_mounts_HTTP_adapter_with_pool_options(self, HTTPAdapter):
+        session = Mock()
+        mount_retry_adapter(session, retries=3, pool_connections=2,
+                            pool_maxsize=20, pool_block=True)
+
+        HTTPAdapter.assert_called_once_with(
+            max_retries=3, pool_connections=2, pool_maxsize=20,
+            pool_block=True)
+
+
+class BuildAdapterTestCase(TestCase):
+
+    def test_builds_adapter_with_pool_options(self):
+        adapter = build_adapter(pool_maxsize=20, pool_block=True)
+
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertEqual(adapter._pool_block, True)
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_builds_adapter_with_tcp_keepalive(self):
+        adapter = build_adapter(tcp_keepalive=True)
+
+        self.assertIsInstance(adapter, KeepAliveAdapter)
+        socket_options = adapter.poolmanager.connection_pool_kw[
+            'socket_options']
+        self.assertIn(KEEPALIVE_SOCKET_OPTIONS[0], socket_options)
+
+
+class PoolStatsTestCase(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.session = requests.Session()
+        mount_retry_adapter(self.session, None, pool_maxsize=5)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_returns_empty_stats_without_requests(self):
+        self.assertEqual(pool_stats(self.session), [])
+
+    def test_returns_pool_usage(self):
+        self.session.get(self.server.url + '/resource')
+        self.session.get(self.server.url + '/resource')
+
+        stats, = pool_stats(self.session)
+
+        self.assertEqual(stats, {
+            'scheme': 'http',
+            'host': '127.0.0.1',
+            'port': self.server.server_address[1],
+            'maxsize': 5,
+            'in_use': 0,
+            'idle': 1,
+            'closed': 0,
+            'num_connections': 1,
+            'num_requests': 2,
+        })
+
+    def test_counts_connections_in_use(self):
+        response = self.session.get(self.server.url + '/resource',
+                                    stream=True)
+
+        stats, = pool_stats(self.session)
+        response.close()
+
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['idle'], 0)
+
+
+class ReleaseResponseTestCase(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.session = requests.Session()
+        mount_retry_adapter(self.session, None)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_drains_responses_returning_their_connection(self):
+        response = self.session.get(self.server.url + '/resource',
+                                    stream=True)
+
+        self.assertTrue(release_response(response))
+
+        stats, = pool_stats(self.session)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['closed'], 0)
+
+    def test_closes_responses_larger_than_the_limit(self):
+        response = self.session.get(self.server.url + '/resource',
+                                    stream=True)
+
+        self.assertFalse(release_response(response, limit=1))
+
+        stats, = pool_stats(self.session)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['closed'], 1)
+
+    def test_closes_consumed_responses(self):
+        response = Mock(_content_consumed=True)
+
+        self.assertTrue(release_response(response))
+        response.close.assert_called_once_with()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from unittest import TestCase
+
+from alf.aio import (AsyncClient, AsyncTokenManager, AiohttpTransport,
+                     RequestsTransport, aiohttp)
+from alf.tokens import TokenDefaultStorage
+from tests.server import StubServer
+
+
+class AsyncClientTestCase(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.server.stop()
+
+    def transport(self):
+        return RequestsTransport()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def client(self, **kwargs):
+        return AsyncClient(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            transport=self.transport(),
+            **kwargs)
+
+    def test_should_request_resource_with_bearer_token(self):
+        async def request():
+            async with self.client() as client:
+                return await client.get(self.server.url + '/resource')
+
+        response = self.run_async(request())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['authorization'], 'Bearer token-1')
+
+    def test_should_request_token_once_for_concurrent_requests(self):
+        self.server.latency = 0.05
+
+        async def request():
+            async with self.client() as client:
+                return await asyncio.gather(*[
+                    client.get(self.server.url + '/resource')
+                    for _ in range(10)])
+
+        responses = self.run_async(request())
+
+        self.assertEqual(self.server.token_requests, 1)
+        self.assertEqual([r.status_code for r in responses], [200] * 10)
+
+    def test_should_retry_a_bad_request_once_with_a_new_token(self):
+        self.server.rejected_authorizations.add('Bearer token-1')
+
+        async def request():
+            async with self.client() as client:
+                return await client.get(self.server.url + '/resource')
+
+        response = self.run_async(request())
+
+        self.assertEqual(self.server.token_requests, 2)
+        self.assertEqual(response.json()['authorization'], 'Bearer token-2')
+
+    def test_should_return_error_response_when_token_fails(self):
+        self.server.token_status = 500
+
+        async def request():
+            async with self.client() as client:
+                response = await client.get(self.server.url + '/resource')
+                return response, client._token_manager._has_token()
+
+        response, has_token = self.run_async(request())
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(has_token)
+
+    def test_should_use_token_storage(self):
+        storage = TokenDefaultStorage()
+
+        async def request(client):
+            async with client:
+                return await client.get(self.server.url + '/resource')
+
+        self.run_async(request(self.client(token_storage=storage)))
+        response = self.run_async(
+            request(self.client(token_storage=storage)))
+
+        self.assertEqual(self.server.token_requests, 1)
+        self.assertEqual(response.json()['authorization'], 'Bearer token-1')
+
+    def test_should_not_block_the_event_loop(self):
+        self.server.latency = 0.2
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        async def request():
+            ticker = asyncio.ensure_future(tick())
+            async with self.client() as client:
+                await client.get(self.server.url + '/resource')
+            ticker.cancel()
+
+        self.run_async(request())
+
+        self.assertTrue(len(ticks) > 10)
+
+
+class AiohttpTransportTestCase(AsyncClientTestCase):
+
+    def setUp(self):
+        if aiohttp is None:
+            self.skipTest("You don't have aiohttp installed")
+        super(AiohttpTransportTestCase, self).setUp()
+
+    def transport(self):
+        return AiohttpTransport()
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        await asyncio.sleep(0)
+        if method == 'POST':
+            return FakeResponse(200, {'access_token': 'token',
+                                      'expires_in': 100})
+        return FakeResponse(200)
+
+    async def close(self):
+        pass
+
+
+class AsyncTokenManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.transport = FakeTransport()
+        self.manager = AsyncTokenManager(
+            'http://endpoint/token', 'client_id', 'client_secret',
+            transport=self.transport, token_request_params={'timeout': 5})
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_should_request_token_with_client_credentials(self):
+        token = self.loop.run_until_complete(self.manager.get_token())
+
+        self.assertEqual(token, 'token')
+        self.assertEqual(self.transport.requests, [(
+            'POST', 'http://endpoint/token',
+            {'data': {'grant_type': 'client_credentials'},
+             'auth': ('client_id', 'client_secret'),
+             'timeout': 5})])
+
+    def test_should_reset_token(self):
+        self.loop.run_until_complete(self.manager.get_token())
+        self.loop.run_until_complete(self.manager.reset_token())
+
+        self.assertFalse(self.manager._has_token())
+
+    def test_should_use_a_pluggable_transport_on_client(self):
+        client = AsyncClient(
+            token_endpoint='http://endpoint/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            transport=self.transport)
+
+        self.loop.run_until_complete(
+            client.get('http://api/resource', headers={'Accept': 'json'}))
+
+        method, url, kwargs = self.transport.requests[-1]
+        self.assertEqual((method, url), ('GET', 'http://api/resource'))
+        self.assertEqual(kwargs['headers'], {'Accept': 'json',
+                                             'Authorization': 'Bearer token'})
@@ -17,6 +17,9 @@ class TestBearerTokenAuth(TestCase):
         self.auth(self.request)
         self.assertEqual(self.request.headers['Authorization'], 'Bearer token')
 
+    def test_should_build_authorization_header_once(self):
+        self.assertEqual(self.auth._authorization, 'Bearer token')
+
     def test_should_return_the_request_object(self):
         modified_request = self.auth(self.request)
         self.assertEqual(self.request, modified_request)
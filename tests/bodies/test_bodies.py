@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import io
+from unittest import TestCase
+
+import requests
+
+from alf.bodies import (MemoryViewBody, ReplayableIterable, make_replayable,
+                        rewind_body)
+
+
+class TestMemoryViewBody(TestCase):
+
+    def test_should_read_slices_of_the_buffer(self):
+        buffer = bytearray(b'some body')
+        body = MemoryViewBody(buffer)
+
+        chunk = body.read(4)
+        buffer[0:4] = b'SOME'
+
+        self.assertEqual(bytes(chunk), b'SOME')
+        self.assertEqual(bytes(body.read()), b' body')
+        self.assertEqual(bytes(body.read()), b'')
+
+    def test_should_have_the_remaining_length(self):
+        body = MemoryViewBody(b'some body')
+        body.read(5)
+
+        self.assertEqual(len(body), 4)
+        self.assertEqual(body.tell(), 5)
+
+    def test_should_seek(self):
+        body = MemoryViewBody(b'some body')
+
+        body.seek(-4, io.SEEK_END)
+        self.assertEqual(bytes(body.read()), b'body')
+
+        body.seek(0)
+        self.assertEqual(bytes(body.read(4)), b'some')
+
+
+class TestReplayableIterable(TestCase):
+
+    def test_should_iterate_again(self):
+        body = ReplayableIterable(chunk for chunk in [b'some', b'body'])
+
+        self.assertEqual(list(body), [b'some', b'body'])
+        self.assertEqual(list(body), [b'some', b'body'])
+        self.assertTrue(body.replayable)
+
+    def test_should_drop_the_chunks_beyond_the_limit(self):
+        body = ReplayableIterable(
+            (chunk for chunk in [b'some', b'body']), limit=6)
+
+        self.assertEqual(list(body), [b'some', b'body'])
+        self.assertFalse(body.replayable)
+
+
+class TestMakeReplayable(TestCase):
+
+    def test_should_keep_bodies_that_can_be_sent_again(self):
+        upload = io.BytesIO(b'body')
+        for data in [b'body', u'body', {'key': 'value'}, [('key', 'value')],
+                     upload]:
+            self.assertIs(make_replayable(data), data)
+
+    def test_should_wrap_buffers_and_generators(self):
+        self.assertIsInstance(make_replayable(bytearray(b'body')),
+                              MemoryViewBody)
+        self.assertIsInstance(make_replayable(chunk for chunk in [b'body']),
+                              ReplayableIterable)
+
+
+class TestRewindBody(TestCase):
+
+    def _prepare(self, data):
+        return requests.Request('POST', 'http://api/', data=data).prepare()
+
+    def test_should_rewind_files(self):
+        upload = io.BytesIO(b'some body')
+        upload.read(5)
+        request = self._prepare(upload)
+        upload.read()
+
+        self.assertTrue(rewind_body(request))
+        self.assertEqual(upload.read(), b'body')
+
+    def test_should_not_rewind_unknown_streams(self):
+        request = self._prepare(chunk for chunk in [b'body'])
+
+        self.assertFalse(rewind_body(request))
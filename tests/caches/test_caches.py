@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import email.utils
+import time
+from unittest import TestCase
+
+import requests
+from mock import patch
+
+from alf.caches import ResponseCache, freshness_lifetime, parse_cache_control
+
+
+def build_response(headers=None, content=b'content', status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = 'http://api/resource'
+    response.headers.update(headers or {})
+    response._content = content
+    return response
+
+
+class TestFreshness(TestCase):
+
+    def test_should_parse_cache_control(self):
+        self.assertEqual(parse_cache_control('max-age=60, no-cache, private'),
+                         {'max-age': '60', 'no-cache': None, 'private': None})
+
+    def test_should_use_max_age_minus_age(self):
+        self.assertEqual(freshness_lifetime(
+            {'Cache-Control': 'max-age=60', 'Age': '10'}), 50)
+
+    def test_should_use_expires(self):
+        now = time.time()
+        self.assertEqual(freshness_lifetime({
+            'Date': email.utils.formatdate(now, usegmt=True),
+            'Expires': email.utils.formatdate(now + 30, usegmt=True)}), 30)
+
+    def test_should_not_be_fresh_with_no_cache(self):
+        self.assertEqual(freshness_lifetime(
+            {'Cache-Control': 'no-cache, max-age=60'}), 0)
+
+    def test_should_have_no_freshness_without_headers(self):
+        self.assertIsNone(freshness_lifetime({}))
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(max_bytes=1000, max_entry_bytes=500)
+
+    def test_should_store_fresh_responses(self):
+        self.cache.store('key', build_response(
+            {'Cache-Control': 'max-age=60'}), {})
+
+        entry = self.cache.get('key', {})
+
+        self.assertTrue(entry.is_fresh())
+        response = entry.to_response()
+        self.assertEqual(response.content, b'content')
+        self.assertTrue(response.from_cache)
+
+    def test_should_NOT_store_responses_without_freshness_or_validators(self):
+        for headers in [{}, {'Cache-Control': 'no-store, max-age=60'},
+                        {'Cache-Control': 'max-age=60', 'Vary': '*'}]:
+            self.assertIsNone(
+                self.cache.store('key', build_response(headers), {}))
+
+        self.assertIsNone(self.cache.store('key', build_response(
+            {'Cache-Control': 'max-age=60'}, status_code=404), {}))
+        self.assertEqual(len(self.cache), 0)
+
+    @patch('alf.caches.monotonic')
+    def test_should_keep_stale_responses_with_validators(self, monotonic):
+        monotonic.return_value = 100
+        self.cache.store('stale', build_response(
+            {'Cache-Control': 'max-age=10'}), {})
+        self.cache.store('etag', build_response(
+            {'Cache-Control': 'max-age=10', 'ETag': '"v1"'}), {})
+
+        monotonic.return_value = 110
+
+        self.assertIsNone(self.cache.get('stale', {}))
+        entry = self.cache.get('etag', {})
+        self.assertFalse(entry.is_fresh())
+        self.assertEqual(entry.validators(), {'If-None-Match': '"v1"'})
+
+    def test_should_match_vary_headers(self):
+        self.cache.store('key', build_response(
+            {'Cache-Control': 'max-age=60', 'Vary': 'Accept'}),
+            {'Accept': 'application/json'})
+
+        self.assertIsNotNone(
+            self.cache.get('key', {'Accept': 'application/json'}))
+        self.assertIsNone(self.cache.get('key', {'Accept': 'text/html'}))
+
+    def test_should_evict_least_recently_used_beyond_max_bytes(self):
+        headers = {'Cache-Control': 'max-age=60'}
+        for key in ('first', 'second', 'third'):
+            self.cache.store(key, build_response(headers, b'x' * 400), {})
+            self.cache.get('first', {})
+
+        self.assertIsNotNone(self.cache.get('first', {}))
+        self.assertIsNone(self.cache.get('second', {}))
+        self.assertTrue(self.cache.size <= 1000)
+
+    def test_should_NOT_store_responses_larger_than_max_entry_bytes(self):
+        self.assertIsNone(self.cache.store('key', build_response(
+            {'Cache-Control': 'max-age=60'}, b'x' * 600), {}))
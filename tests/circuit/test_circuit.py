@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import requests
+from mock import Mock, patch
+
+from alf.circuit import CircuitBreaker, CircuitOpenError
+from alf.tokens import TokenError
+
+
+class TestCircuitBreaker(TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, backoff=10,
+                                      max_backoff=30, jitter=0)
+        self.response = Mock(status_code=503)
+
+    def _fail(self, response=None):
+        def func():
+            raise TokenError('Failed to request token', response)
+
+        with self.assertRaises(TokenError):
+            self.breaker.call(func)
+
+    def _open(self):
+        self._fail(self.response)
+        self._fail(self.response)
+
+    def test_should_open_after_repeated_failures(self):
+        self._fail(self.response)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self._fail(self.response)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_should_fail_fast_with_the_last_response_while_open(self):
+        self._open()
+        func = Mock()
+
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.call(func)
+
+        self.assertIs(context.exception.response, self.response)
+        self.assertFalse(func.called)
+
+    def test_should_not_count_rejected_credentials(self):
+        self._fail(Mock(status_code=401))
+        self._fail(Mock(status_code=401))
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_should_count_connection_errors(self):
+        func = Mock(side_effect=requests.ConnectionError())
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(func)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertIsNone(self.breaker.last_response)
+
+    @patch('alf.circuit.monotonic')
+    def test_should_probe_once_after_the_backoff(self, monotonic):
+        monotonic.return_value = 100
+        self._open()
+        self.assertEqual(self.breaker.retry_in(), 10)
+
+        monotonic.return_value = 110
+        probe = Mock(return_value='token')
+        self.assertEqual(self.breaker.call(probe), 'token')
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats()['failures'], 0)
+
+    @patch('alf.circuit.monotonic')
+    def test_should_fail_fast_while_probing(self, monotonic):
+        monotonic.return_value = 100
+        self._open()
+        monotonic.return_value = 110
+
+        def probe():
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.call(Mock())
+            return 'token'
+
+        self.assertEqual(self.breaker.call(probe), 'token')
+
+    @patch('alf.circuit.monotonic')
+    def test_should_double_the_backoff_when_the_probe_fails(self, monotonic):
+        monotonic.return_value = 100
+        self._open()
+
+        for retry_in in (20, 30):
+            monotonic.return_value += self.breaker.retry_in()
+            self._fail(self.response)
+
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+            self.assertEqual(self.breaker.retry_in(), retry_in)
+
+    @patch('alf.circuit.random.random')
+    def test_should_add_jitter_to_the_backoff(self, random):
+        random.return_value = 0.5
+        self.breaker = CircuitBreaker(failure_threshold=1, backoff=10,
+                                      jitter=0.5)
+
+        self._fail(self.response)
+
+        self.assertAlmostEqual(self.breaker.retry_in(), 7.5, places=1)
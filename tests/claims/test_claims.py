@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+from unittest import TestCase
+
+from alf.claims import decode_claims, jwt_expires_in
+
+
+def encode_jwt(claims):
+    def encode(value):
+        return base64.urlsafe_b64encode(
+            json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+    return '{}.{}.signature'.format(encode({'alg': 'RS256'}), encode(claims))
+
+
+class TestDecodeClaims(TestCase):
+
+    def test_should_decode_the_payload(self):
+        self.assertEqual(decode_claims(encode_jwt({'exp': 1000, 'sub': 'alf'})),
+                         {'exp': 1000, 'sub': 'alf'})
+
+    def test_should_ignore_opaque_tokens(self):
+        for access_token in ['opaque', 'a.b.c', 'a.W10.c', None]:
+            self.assertIsNone(decode_claims(access_token))
+
+
+class TestJwtExpiresIn(TestCase):
+
+    def test_should_calc_from_exp(self):
+        access_token = encode_jwt({'exp': 1100})
+
+        self.assertEqual(jwt_expires_in(access_token, now=1000), 100)
+
+    def test_should_subtract_clock_skew(self):
+        access_token = encode_jwt({'exp': 1100})
+
+        self.assertEqual(jwt_expires_in(access_token, 30, now=1000), 70)
+        self.assertEqual(jwt_expires_in(access_token, 300, now=1000), 0)
+
+    def test_should_limit_to_the_lifetime_of_the_token(self):
+        access_token = encode_jwt({'nbf': 1000, 'exp': 1100})
+
+        self.assertEqual(jwt_expires_in(access_token, now=900), 100)
+
+    def test_should_use_iat_without_nbf(self):
+        access_token = encode_jwt({'iat': 1000, 'exp': 1100})
+
+        self.assertEqual(jwt_expires_in(access_token, now=900), 100)
+
+    def test_should_ignore_tokens_without_exp(self):
+        self.assertIsNone(jwt_expires_in(encode_jwt({'sub': 'alf'})))
+        self.assertIsNone(jwt_expires_in(encode_jwt({'exp': 'tomorrow'})))
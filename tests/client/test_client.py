@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import io
+import threading
+import time
 from mock import patch, Mock
 from unittest import TestCase
 
+import requests
+
+from alf.adapters import KeepAliveAdapter
+from alf.caches import ResponseCache
+from alf.circuit import CircuitBreaker, CircuitOpenError
 from alf.managers import TokenManager
+from alf.hedging import HedgePolicy
+from alf.metrics import (DISCARDED_RESPONSES, HEDGE_WINS, InMemoryMetrics,
+                         RESOURCE_RETRIES, RETRY_BUDGET_REJECTIONS)
+from alf.registry import shared_registry
+from alf.retries import ResourceRetry, RetryBudget
 from alf.client import Client, BearerTokenAuth
+from tests.server import StubServer
 
 
 class TestClient(TestCase):
@@ -40,17 +54,148 @@ class TestClient(TestCase):
                                     'timeout': 10
                                 },
                                 token_retries=None,
-                                token_storage=None)
+                                token_storage=None,
+                                token_refresh_ratio=None,
+                                token_refresh_margin=None,
+                                token_lease_ttl=None,
+                                token_sync_interval=None,
+                                token_circuit_breaker=None,
+                                token_grace_period=None,
+                                token_jwt_expiry=False,
+                                token_clock_skew=0,
+                                metrics=None,
+                                pool_options=None)
+
+    @patch('alf.client.TokenManager.__init__')
+    def test_should_configure_connection_pools(self, init):
+        init.return_value = None
+
+        client = Client(
+            token_endpoint=self.end_point,
+            client_id='client_id',
+            client_secret='client_secret',
+            pool_maxsize=20,
+            pool_block=True,
+            tcp_keepalive=True)
+
+        pool_options = {'pool_maxsize': 20, 'pool_block': True,
+                        'tcp_keepalive': True}
+        self.assertEqual(init.call_args[1]['pool_options'], pool_options)
+        adapter = client.get_adapter(self.resource_url)
+        self.assertIsInstance(adapter, KeepAliveAdapter)
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertIs(client.get_adapter('https://api'), adapter)
+
+    def test_should_return_pool_stats(self):
+        client = Client(token_endpoint=self.end_point,
+                        client_id='client_id', client_secret='client_secret')
+
+        self.assertEqual(client.pool_stats(), {'resource': [], 'token': []})
+
+    @patch('alf.client.TokenManager._request_token')
+    @patch('requests.Session.request')
+    def test_should_request_resource_with_credentials_of_the_call(self, request, _request_token):
+        request.return_value = Mock(status_code=200)
+        _request_token.side_effect = lambda: {
+            'access_token': 'access_token_{}'.format(_request_token.call_count),
+            'expires_in': 100}
+
+        client = Client(
+            token_endpoint=self.end_point,
+            client_id='client_id',
+            client_secret='client_secret',
+            max_tenants=10)
+
+        client.get(self.resource_url)
+        client.get(self.resource_url, credentials=('other_id', 'secret'))
+        client.get(self.resource_url, credentials=('other_id', 'secret'))
+
+        tokens = [kwargs['auth']._access_token
+                  for args, kwargs in request.call_args_list]
+        self.assertEqual(tokens, ['access_token_1', 'access_token_2',
+                                  'access_token_2'])
+        self.assertNotIn('credentials', request.call_args[1])
+
+        registry = client._token_manager_registry
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry._max_size, 10)
+        self.assertIs(registry._session, client._token_manager._session)
+
+    @patch('alf.client.TokenManager._request_token')
+    @patch('requests.Session.request')
+    def test_should_request_resource_with_token_of_the_scope(self, request, _request_token):
+        request.return_value = Mock(status_code=200)
+        _request_token.side_effect = lambda: {
+            'access_token': 'access_token_{}'.format(_request_token.call_count),
+            'expires_in': 100}
+
+        client = Client(
+            token_endpoint=self.end_point,
+            client_id='client_id',
+            client_secret='client_secret')
+
+        client.get(self.resource_url, scope='read write')
+        client.get(self.resource_url, scope='read')
+        client.get(self.resource_url, scope='admin')
+        client.get(self.resource_url)
+
+        tokens = [kwargs['auth']._access_token
+                  for args, kwargs in request.call_args_list]
+        self.assertEqual(tokens, ['access_token_1', 'access_token_1',
+                                  'access_token_2', 'access_token_3'])
+        self.assertNotIn('scope', request.call_args[1])
 
     @patch('alf.client.TokenManager')
+    @patch('requests.Session.send')
     @patch('requests.Session.request')
-    def test_should_retry_a_bad_request_once(self, request, Manager):
-        request.return_value = Mock(status_code=401)
-        self._fake_manager(Manager, has_token=False)
+    def test_should_retry_a_bad_request_once(self, request, send, Manager):
+        request.return_value = self._unauthorized_response()
+        send.return_value = Mock(status_code=401)
+        self._fake_manager(Manager, access_token=['access_token_1', 'access_token_2'])
+
+        response = self._request(Manager)
+
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(send.call_count, 1)
+        self.assertIs(response, send.return_value)
+        retried = send.call_args[0][0]
+        self.assertEqual(retried.headers['Authorization'], 'Bearer access_token_2')
+
+    @patch('alf.client.TokenManager')
+    @patch('requests.Session.send')
+    @patch('requests.Session.request')
+    def test_should_reset_the_rejected_token(self, request, send, Manager):
+        request.return_value = self._unauthorized_response()
+        send.return_value = Mock(status_code=401)
+        manager = self._fake_manager(Manager, access_token='access_token')
 
         self._request(Manager)
 
-        self.assertEqual(request.call_count, 2)
+        manager.reset_token.assert_called_once_with('access_token')
+
+    @patch('alf.client.TokenManager')
+    @patch('requests.Session.request')
+    def test_should_reuse_auth_while_token_does_not_change(self, request, Manager):
+        request.return_value = Mock(status_code=200)
+        manager = self._fake_manager(Manager, access_token='access_token')
+
+        class ClientTest(Client):
+            token_manager_class = Manager
+
+        client = ClientTest(
+            token_endpoint=self.end_point,
+            client_id='client_id',
+            client_secret='client_secret')
+
+        client.get(self.resource_url)
+        client.get(self.resource_url)
+        manager.get_token.return_value = 'new_access_token'
+        client.get(self.resource_url)
+
+        auths = [kwargs['auth'] for args, kwargs in request.call_args_list]
+        self.assertIs(auths[0], auths[1])
+        self.assertIsNot(auths[1], auths[2])
+        self.assertEqual(auths[2]._access_token, 'new_access_token')
 
     @patch('requests.Session.post')
     @patch('requests.Session.request')
@@ -87,9 +232,11 @@ class TestClient(TestCase):
 
     @patch('alf.client.TokenManager._has_token')
     @patch('alf.client.TokenManager.reset_token')
+    @patch('requests.Session.send')
     @patch('requests.Session.request')
-    def test_should_reset_token_when_gets_an_unauthorized_error(self, request, reset_token, _has_token):
-        request.return_value = Mock(status_code=401)
+    def test_should_reset_token_when_gets_an_unauthorized_error(self, request, send, reset_token, _has_token):
+        request.return_value = self._unauthorized_response()
+        send.return_value = Mock(status_code=401)
         _has_token.return_value = True
 
         client = Client(
@@ -120,6 +267,12 @@ class TestClient(TestCase):
         self.assertIsInstance(auth, BearerTokenAuth)
         self.assertEqual(auth._access_token, access_token)
 
+    def _unauthorized_response(self):
+        prepared = requests.Request(
+            'GET', self.resource_url, auth=BearerTokenAuth('access_token')
+        ).prepare()
+        return Mock(status_code=401, request=prepared)
+
     def _request(self, manager):
         class ClientTest(Client):
             token_manager_class = manager
@@ -145,3 +298,507 @@ class TestClient(TestCase):
         Manager.return_value = manager
 
         return manager
+
+
+class TestClientBatch(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            pool_maxsize=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def _batch(self, size):
+        return [('GET', '{}/resource/{}'.format(self.server.url, index))
+                for index in range(size)]
+
+    def test_should_return_responses_in_order(self):
+        responses = self.client.map(self._batch(20), max_workers=5)
+
+        self.assertEqual([r.url for r in responses],
+                         [url for method, url in self._batch(20)])
+        self.assertEqual(self.server.token_requests, 1)
+
+    def test_should_accept_requests_as_dicts_and_tuples_with_kwargs(self):
+        responses = self.client.map([
+            {'method': 'POST', 'url': self.server.url + '/resource',
+             'data': 'dict'},
+            ('PUT', self.server.url + '/resource', {'data': 'tuple'}),
+        ])
+
+        self.assertEqual([r.json()['body'] for r in responses],
+                         ['dict', 'tuple'])
+
+    def test_should_stream_results_as_completed(self):
+        results = list(self.client.imap(self._batch(10), max_workers=3,
+                                        ordered=False))
+
+        self.assertEqual(sorted(index for index, result in results),
+                         list(range(10)))
+
+    def test_should_limit_concurrent_requests(self):
+        self.server.latency = 0.05
+        active = []
+        concurrency = []
+        lock = threading.Lock()
+        original_request = self.client._request
+
+        def request(*args, **kwargs):
+            with lock:
+                active.append(1)
+                concurrency.append(len(active))
+            try:
+                return original_request(*args, **kwargs)
+            finally:
+                with lock:
+                    active.pop()
+
+        self.client._request = request
+        self.client.map(self._batch(12), max_workers=3)
+
+        self.assertEqual(max(concurrency), 3)
+
+    def test_should_capture_errors_of_each_request(self):
+        batch = self._batch(2) + [('GET', 'http://127.0.0.1:1/resource')]
+
+        responses = self.client.map(batch)
+
+        self.assertEqual([r.status_code for r in responses[:2]], [200, 200])
+        self.assertIsInstance(responses[2], requests.ConnectionError)
+
+    def test_should_reset_token_once_when_requests_are_unauthorized(self):
+        self.server.latency = 0.05
+        self.client.get(self.server.url + '/resource')
+        self.server.rejected_authorizations.add('Bearer token-1')
+
+        responses = self.client.map(self._batch(10), max_workers=10)
+
+        self.assertEqual([r.status_code for r in responses], [200] * 10)
+        self.assertEqual(self.server.token_requests, 2)
+        self.assertEqual(
+            set(r.json()['authorization'] for r in responses),
+            set(['Bearer token-2']))
+
+    def test_should_return_token_error_responses(self):
+        self.server.token_status = 500
+
+        responses = self.client.map(self._batch(3))
+
+        self.assertEqual([r.status_code for r in responses], [500] * 3)
+
+
+class TestClientBodyReplay(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            body_replay_limit=10)
+        self.client.get(self.server.url + '/resource')
+        self.server.rejected_authorizations.add('Bearer token-1')
+        self.url = self.server.url + '/upload'
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def assertBodySentTwice(self, response, body):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['authorization'], 'Bearer token-2')
+        self.assertEqual(self.server.requests[1:],
+                         [('POST', '/upload', body)] * 2)
+
+    def test_should_replay_generator_bodies(self):
+        response = self.client.post(
+            self.url, data=(chunk for chunk in [b'some', b'body']))
+
+        self.assertBodySentTwice(response, b'somebody')
+
+    def test_should_replay_file_bodies(self):
+        response = self.client.post(self.url, data=io.BytesIO(b'file body'))
+
+        self.assertBodySentTwice(response, b'file body')
+
+    def test_should_replay_buffers_without_copying(self):
+        buffer = bytearray(b'buffer body')
+
+        response = self.client.post(self.url, data=memoryview(buffer))
+
+        self.assertBodySentTwice(response, b'buffer body')
+
+    def test_should_not_retry_generators_larger_than_the_limit(self):
+        response = self.client.post(
+            self.url, data=(chunk for chunk in [b'a larger', b' body']))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class TestClientCircuitBreaker(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.breaker = CircuitBreaker(failure_threshold=2, backoff=60)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _client(self, token_endpoint):
+        return Client(
+            token_endpoint=token_endpoint,
+            client_id='client_id',
+            client_secret='client_secret',
+            token_circuit_breaker=self.breaker)
+
+    def test_should_stop_requesting_tokens_while_the_endpoint_fails(self):
+        self.server.token_status = 503
+        client = self._client(self.server.url + '/token')
+
+        responses = [client.get(self.server.url + '/resource')
+                     for _ in range(5)]
+
+        self.assertEqual([r.status_code for r in responses], [503] * 5)
+        self.assertEqual(self.server.token_requests, 2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.server.requests, [])
+
+    def test_should_raise_while_the_endpoint_is_unreachable(self):
+        client = self._client('http://127.0.0.1:1/token')
+
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                client.get(self.server.url + '/resource')
+
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.server.url + '/resource')
+
+
+class TestClientSharedTokenManager(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+
+    def tearDown(self):
+        shared_registry().clear()
+        self.server.stop()
+
+    def _client(self, **kwargs):
+        return Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            **kwargs)
+
+    def test_should_share_token_between_clients(self):
+        client = self._client(share_token_manager=True)
+        other_client = self._client(share_token_manager=True)
+
+        client.get(self.server.url + '/resource')
+        other_client.get(self.server.url + '/resource')
+
+        self.assertIs(client._token_manager, other_client._token_manager)
+        self.assertEqual(self.server.token_requests, 1)
+
+    def test_should_NOT_share_token_by_default(self):
+        client = self._client()
+        other_client = self._client()
+
+        self.assertIsNot(client._token_manager, other_client._token_manager)
+
+    def test_should_release_token_manager_on_close(self):
+        client = self._client(share_token_manager=True)
+        key = client._token_manager._get_cache_key()
+        with self._client(share_token_manager=True):
+            pass
+
+        self.assertIn(key, shared_registry())
+
+        client.close()
+        client.close()
+        self.assertNotIn(key, shared_registry())
+
+
+class TestClientResourceRetries(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.metrics = InMemoryMetrics()
+        self.budget = RetryBudget()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _client(self, **kwargs):
+        return Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            resource_retries=ResourceRetry(
+                backoff_factor=0, budget=self.budget, **kwargs),
+            metrics=self.metrics)
+
+    def test_should_NOT_retry_by_default(self):
+        self.server.failures = [(503, {})]
+        client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret')
+
+        response = client.get(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_should_retry_unavailable_idempotent_requests(self):
+        self.server.failures = [(503, {}), (502, {})]
+
+        response = self._client().put(self.server.url + '/resource',
+                                      data=iter([b'some', b'body']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests,
+                         [('PUT', '/resource', b'somebody')] * 3)
+        self.assertEqual(self.metrics.counter(
+            RESOURCE_RETRIES, host='127.0.0.1'), 2)
+
+    def test_should_NOT_retry_post_requests(self):
+        self.server.failures = [(503, {})]
+
+        response = self._client().post(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_should_return_the_last_response_after_all_retries(self):
+        self.server.failures = [(503, {})] * 3
+
+        response = self._client(total=2).get(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    @patch('alf.client.time')
+    def test_should_wait_for_retry_after(self, time):
+        self.server.failures = [(429, {'Retry-After': '2'}),
+                                (429, {'Retry-After': '120'})]
+
+        response = self._client().get(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 429)
+        time.sleep.assert_called_once_with(2)
+
+    def test_should_stop_retrying_when_the_budget_is_spent(self):
+        self.budget = RetryBudget(ratio=0, min_retries=1)
+        self.server.failures = [(503, {})] * 3
+
+        response = self._client().get(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.budget.stats(),
+                         {'127.0.0.1': {'retries': 1, 'rejected': 1}})
+        self.assertEqual(self.metrics.counter(
+            RETRY_BUDGET_REJECTIONS, host='127.0.0.1'), 1)
+
+    def test_should_retry_connection_errors(self):
+        client = self._client(total=1)
+
+        with self.assertRaises(requests.ConnectionError):
+            client.get('http://127.0.0.1:1/resource')
+
+        self.assertEqual(self.budget.stats(),
+                         {'127.0.0.1': {'retries': 1, 'rejected': 0}})
+
+
+class TestClientHedging(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.metrics = InMemoryMetrics()
+        self.hedging = HedgePolicy(
+            delay=0.05, budget=RetryBudget(ratio=1, min_retries=10))
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            hedging=self.hedging,
+            metrics=self.metrics)
+
+    def tearDown(self):
+        self.client.close()
+        self.hedging.shutdown()
+        self.server.stop()
+
+    def test_should_hedge_slow_requests(self):
+        self.server.delays = [1]
+
+        started = time.time()
+        response = self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(time.time() - started < 0.5)
+        self.assertEqual(self.metrics.counter(
+            HEDGE_WINS, host='127.0.0.1'), 1)
+
+    def test_should_NOT_hedge_fast_requests(self):
+        self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_should_NOT_hedge_unsafe_methods(self):
+        self.server.delays = [0.2]
+
+        self.client.post(self.server.url + '/resource')
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_should_NOT_hedge_beyond_the_budget(self):
+        self.hedging.budget = RetryBudget(ratio=0, min_retries=0)
+        self.server.delays = [0.2]
+
+        self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_should_request_a_new_token_once_when_hedges_are_unauthorized(self):
+        self.client.get(self.server.url + '/resource')
+        self.server.rejected_authorizations.add('Bearer token-1')
+        self.server.delays = [0.2]
+
+        response = self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(response.json()['authorization'], 'Bearer token-2')
+        self.assertEqual(self.server.token_requests, 2)
+
+
+class TestClientResponseCache(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.cache = ResponseCache()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            response_cache=self.cache)
+        self.url = self.server.url + '/resource'
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_should_serve_fresh_responses_from_cache(self):
+        self.server.response_headers = {'Cache-Control': 'max-age=60'}
+
+        responses = [self.client.get(self.url) for _ in range(3)]
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(responses[2].json(), responses[0].json())
+        self.assertTrue(responses[2].from_cache)
+
+    def test_should_revalidate_stale_responses(self):
+        self.server.response_headers = {'Cache-Control': 'no-cache',
+                                        'ETag': '"v1"'}
+
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(self.server.not_modified, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+
+    def test_should_keep_responses_when_the_token_changes(self):
+        self.server.response_headers = {'Cache-Control': 'max-age=60'}
+        self.client.get(self.url)
+
+        self.client._token_manager.reset_token()
+        self.client.get(self.url)
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_should_key_responses_by_credentials_and_url(self):
+        self.server.response_headers = {'Cache-Control': 'max-age=60'}
+
+        self.client.get(self.url)
+        self.client.get(self.url, params={'page': 2})
+        self.client.get(self.url, credentials=('other_id', 'other_secret'))
+        self.client.get(self.url, scope='read')
+
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_should_NOT_cache_other_methods(self):
+        self.server.response_headers = {'Cache-Control': 'max-age=60'}
+
+        self.client.post(self.url)
+        self.client.post(self.url)
+
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_should_skip_the_cache_with_no_cache_requests(self):
+        self.server.response_headers = {'Cache-Control': 'max-age=60'}
+
+        self.client.get(self.url)
+        self.client.get(self.url, headers={'Cache-Control': 'no-cache'})
+
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class TestClientConnectionReuse(TestCase):
+
+    # Each connection opened to the server is counted; the token and resource
+    # requests have one connection each.
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.metrics = InMemoryMetrics()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            metrics=self.metrics)
+        self.client.get(self.server.url + '/resource')
+        self.server.rejected_authorizations.add('Bearer token-1')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_should_reuse_the_connection_of_unauthorized_responses(self):
+        response = self.client.get(self.server.url + '/resource', stream=True)
+        response.close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.metrics.counter(
+            DISCARDED_RESPONSES, result='drained'), 1)
+
+    def test_should_release_unauthorized_responses_on_token_errors(self):
+        self.server.token_status = 500
+
+        response = self.client.get(self.server.url + '/resource', stream=True)
+
+        stats, = self.client.pool_stats()['resource']
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['closed'], 0)
+
+    def test_should_reuse_the_connection_of_retried_responses(self):
+        self.client._resource_retries = ResourceRetry(
+            backoff_factor=0, budget=RetryBudget())
+        self.server.rejected_authorizations.clear()
+        self.server.failures = [(503, {}), (503, {})]
+
+        response = self.client.get(self.server.url + '/resource', stream=True)
+        response.close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.metrics.counter(
+            DISCARDED_RESPONSES, result='drained'), 2)
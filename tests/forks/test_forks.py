@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+from unittest import TestCase, skipUnless
+
+from alf import forks
+from alf.client import Client
+from tests.server import StubServer
+
+
+def _request_in_child(client, url, queue):
+    response = client.get(url)
+    queue.put((response.status_code, response.json()['authorization']))
+
+
+class TestForks(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_warm_up_should_request_the_token(self):
+        self.assertEqual(self.client.warm_up(), 'token-1')
+        self.assertEqual(self.server.token_requests, 1)
+
+    def test_should_keep_the_token_and_reset_pools_after_fork(self):
+        self.client.get(self.server.url + '/resource')
+        token_manager = self.client._token_manager
+        lock = token_manager._lock
+        token = token_manager._token
+        token_manager._refreshing = True
+
+        forks.after_fork_in_child()
+
+        self.assertIsNot(token_manager._lock, lock)
+        self.assertIs(token_manager._token, token)
+        self.assertFalse(token_manager._refreshing)
+        self.assertEqual(self.client.pool_stats(),
+                         {'resource': [], 'token': []})
+
+    @skipUnless(hasattr(os, 'register_at_fork'), 'requires os.register_at_fork')
+    def test_forked_process_should_use_the_token_of_the_parent(self):
+        self.client.warm_up()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+
+        # The lock is held by the parent while forking.
+        with self.client._token_manager._lock:
+            process = context.Process(
+                target=_request_in_child,
+                args=(self.client, self.server.url + '/resource', queue))
+            process.start()
+        process.join(10)
+
+        self.assertEqual(queue.get(timeout=1), (200, 'Bearer token-1'))
+        self.assertEqual(self.server.token_requests, 1)
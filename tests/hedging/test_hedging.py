@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import Future
+from unittest import TestCase
+
+from mock import Mock
+
+from alf.hedging import HedgePolicy, discard, first_result
+
+
+def done_future(result=None, exception=None):
+    future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+class TestHedgePolicy(TestCase):
+
+    def test_should_use_fixed_delay(self):
+        policy = HedgePolicy(delay=0.1)
+        policy.observe(5)
+
+        self.assertEqual(policy.delay(), 0.1)
+
+    def test_should_start_adaptive_delay_at_max_delay(self):
+        self.assertEqual(HedgePolicy(max_delay=0.5).delay(), 0.5)
+
+    def test_should_adapt_delay_to_percentile_of_latencies(self):
+        policy = HedgePolicy(percentile=90, min_delay=0, max_delay=10)
+        for index in range(HedgePolicy.RECALC_INTERVAL * 2):
+            policy.observe((index % 10) / 10.0)
+
+        self.assertEqual(policy.delay(), 0.9)
+
+    def test_should_limit_adaptive_delay(self):
+        policy = HedgePolicy(min_delay=0.01, max_delay=1)
+        for _ in range(HedgePolicy.RECALC_INTERVAL):
+            policy.observe(0)
+        self.assertEqual(policy.delay(), 0.01)
+
+        for _ in range(HedgePolicy.RECALC_INTERVAL * 20):
+            policy.observe(5)
+        self.assertEqual(policy.delay(), 1)
+
+    def test_should_hedge_safe_methods_only(self):
+        policy = HedgePolicy()
+
+        self.assertTrue(policy.is_hedged_method('get'))
+        self.assertFalse(policy.is_hedged_method('PUT'))
+
+
+class TestFirstResult(TestCase):
+
+    def test_should_prefer_a_response_to_an_error(self):
+        response = Mock()
+        failed = done_future(exception=ValueError())
+        succeeded = done_future(response)
+
+        self.assertIs(first_result([failed, succeeded]), succeeded)
+
+    def test_should_return_an_error_when_both_fail(self):
+        failed = done_future(exception=ValueError())
+
+        self.assertIs(first_result([failed, done_future(
+            exception=ValueError())]), failed)
+
+    def test_should_close_the_response_of_the_loser(self):
+        winner = done_future(Mock())
+        loser = Future()
+        loser.set_running_or_notify_cancel()
+
+        first_result([winner, loser])
+        response = Mock()
+        loser.set_result(response)
+
+        self.assertTrue(response.close.called)
+
+    def test_should_cancel_a_loser_not_started(self):
+        loser = Future()
+
+        discard(loser)
+
+        self.assertTrue(loser.cancelled())
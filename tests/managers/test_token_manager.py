@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
 from unittest import TestCase
 
 from alf.managers import TokenManager, Token, TokenError
+from alf.storages import FileTokenStorage
+from alf.tokens import TokenDefaultStorage, monotonic
 from freezegun import freeze_time
+from tests.claims.test_claims import encode_jwt
 from mock import Mock, patch
 
 
@@ -157,3 +167,561 @@ class TokenManagerWithRetriesTestCase(BaseTokenManagerTestCase):
 
         self.mount_adapter.assert_called_once_with(
             self.manager._session, 44)
+
+    def test_should_setup_pool_options(self):
+        with patch('alf.managers.mount_retry_adapter') as self.mount_adapter:
+            self.manager = TokenManager(
+                self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET,
+                pool_options={'pool_maxsize': 20})
+
+        self.mount_adapter.assert_called_once_with(
+            self.manager._session, None, pool_maxsize=20)
+
+
+class TokenManagerConcurrencyTestCase(BaseTokenManagerTestCase):
+
+    THREADS = 20
+
+    def _request_token(self):
+        time.sleep(0.05)
+        return {'access_token': 'access_token', 'expires_in': 100}
+
+    def _get_tokens(self, manager):
+        tokens = []
+        start = threading.Event()
+
+        def get_token():
+            start.wait()
+            tokens.append(manager.get_token())
+
+        threads = [threading.Thread(target=get_token)
+                   for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        return tokens
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_request_token_once_for_concurrent_threads(self, _request_token):
+        _request_token.side_effect = self._request_token
+        manager = TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET)
+
+        tokens = self._get_tokens(manager)
+
+        self.assertEqual(_request_token.call_count, 1)
+        self.assertEqual(tokens, ['access_token'] * self.THREADS)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_request_token_once_for_concurrent_threads_with_storage(self, _request_token):
+        _request_token.side_effect = self._request_token
+        storage = TokenDefaultStorage()
+        manager = TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET,
+            token_storage=storage)
+
+        tokens = self._get_tokens(manager)
+
+        self.assertEqual(_request_token.call_count, 1)
+        self.assertEqual(tokens, ['access_token'] * self.THREADS)
+        self.assertEqual(
+            manager._token_storage.request_token()['access_token'],
+            'access_token')
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_request_token_again_after_reset(self, _request_token):
+        _request_token.side_effect = self._request_token
+        manager = TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET)
+
+        self._get_tokens(manager)
+        manager.reset_token()
+        self._get_tokens(manager)
+
+        self.assertEqual(_request_token.call_count, 2)
+
+
+class TokenManagerRefreshAheadTestCase(BaseTokenManagerTestCase):
+
+    def _manager(self, **kwargs):
+        return TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET, **kwargs)
+
+    def _wait_refresh(self, manager):
+        if manager._refresh_thread is not None:
+            manager._refresh_thread.join()
+
+    def test_should_NOT_refresh_ahead_by_default(self):
+        manager = self._manager()
+        manager._token = Token('access_token', Token.calc_expires_on(100))
+        manager._update_token = Mock()
+
+        manager.get_token()
+
+        self.assertIsNone(manager._refresh_on)
+        self.assertIsNone(manager._refresh_thread)
+
+    @freeze_time("2015-01-01 10:00:00")
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_calc_refresh_on_by_ratio(self, _request_token):
+        _request_token.return_value = {'access_token': 'access_token',
+                                       'expires_in': 100}
+        manager = self._manager(token_refresh_ratio=0.8)
+
+        manager.get_token()
+
+        self.assertEqual(manager._refresh_on, monotonic() + 80)
+
+    @freeze_time("2015-01-01 10:00:00")
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_calc_refresh_on_by_margin(self, _request_token):
+        _request_token.return_value = {'access_token': 'access_token',
+                                       'expires_in': 100}
+        manager = self._manager(token_refresh_ratio=0.8,
+                                token_refresh_margin=30)
+
+        manager.get_token()
+
+        self.assertEqual(manager._refresh_on, monotonic() + 70)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_refresh_token_in_background(self, _request_token):
+        _request_token.return_value = {'access_token': 'new_access_token',
+                                       'expires_in': 100}
+        manager = self._manager(token_refresh_ratio=0.5)
+        manager._token = Token('access_token', Token.calc_expires_on(100))
+        manager._refresh_on = monotonic()
+
+        self.assertEqual(manager.get_token(), 'access_token')
+        self._wait_refresh(manager)
+
+        self.assertEqual(_request_token.call_count, 1)
+        self.assertEqual(manager.get_token(), 'new_access_token')
+        self.assertTrue(manager._refresh_on > monotonic())
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_refresh_token_in_background_only_once(self, _request_token):
+        started = threading.Event()
+        finish = threading.Event()
+
+        def request_token():
+            started.set()
+            finish.wait()
+            return {'access_token': 'new_access_token', 'expires_in': 100}
+
+        _request_token.side_effect = request_token
+        manager = self._manager(token_refresh_ratio=0.5)
+        manager._token = Token('access_token', Token.calc_expires_on(100))
+        manager._refresh_on = monotonic()
+
+        manager.get_token()
+        started.wait()
+        self.assertEqual(manager.get_token(), 'access_token')
+        finish.set()
+        self._wait_refresh(manager)
+
+        self.assertEqual(_request_token.call_count, 1)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_keep_token_when_background_refresh_fails(self, _request_token):
+        _request_token.side_effect = TokenError('error', Mock())
+        manager = self._manager(token_refresh_ratio=0.5)
+        manager._token = Token('access_token', Token.calc_expires_on(100))
+        manager._refresh_on = monotonic()
+
+        manager.get_token()
+        self._wait_refresh(manager)
+
+        self.assertEqual(manager.get_token(), 'access_token')
+        self.assertTrue(manager._refresh_on > monotonic())
+        self.assertFalse(manager._refreshing)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_use_token_refreshed_on_storage(self, _request_token):
+        manager = self._manager(token_refresh_ratio=0.5)
+        manager._token = Token('access_token', Token.calc_expires_on(100))
+        manager._refresh_on = monotonic()
+        manager._token_storage(Token('stored_access_token',
+                                     Token.calc_expires_on(200)))
+
+        manager.get_token()
+        self._wait_refresh(manager)
+
+        self.assertFalse(_request_token.called)
+        self.assertEqual(manager.get_token(), 'stored_access_token')
+
+
+class TokenManagerGracePeriodTestCase(BaseTokenManagerTestCase):
+
+    def _manager(self, expired_for=10, **kwargs):
+        manager = TokenManager(self.END_POINT, self.CLIENT_ID,
+                               self.CLIENT_SECRET, token_grace_period=60,
+                               **kwargs)
+        manager._token = Token('stale_access_token',
+                               datetime.now() - timedelta(seconds=expired_for))
+        return manager
+
+    def _wait_refresh(self, manager):
+        if manager._refresh_thread is not None:
+            manager._refresh_thread.join()
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_serve_stale_token_while_refreshing(self, _request_token):
+        _request_token.return_value = {'access_token': 'new_access_token',
+                                       'expires_in': 100}
+        manager = self._manager()
+
+        self.assertEqual(manager.get_token(), 'stale_access_token')
+        self._wait_refresh(manager)
+
+        self.assertEqual(manager.get_token(), 'new_access_token')
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_retry_refresh_later_when_it_fails(self, _request_token):
+        _request_token.side_effect = TokenError('error', Mock())
+        manager = self._manager()
+
+        manager.get_token()
+        self._wait_refresh(manager)
+        refresh_thread = manager._refresh_thread
+
+        self.assertEqual(manager.get_token(), 'stale_access_token')
+        self.assertIs(manager._refresh_thread, refresh_thread)
+        self.assertEqual(_request_token.call_count, 1)
+
+        manager._refresh_on = monotonic()
+        manager.get_token()
+        self._wait_refresh(manager)
+        self.assertEqual(_request_token.call_count, 2)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_NOT_serve_token_expired_beyond_grace_period(self, _request_token):
+        _request_token.return_value = {'access_token': 'new_access_token',
+                                       'expires_in': 100}
+        manager = self._manager(expired_for=61)
+
+        self.assertEqual(manager.get_token(), 'new_access_token')
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_drop_stale_token_when_rejected(self, _request_token):
+        _request_token.return_value = {'access_token': 'new_access_token',
+                                       'expires_in': 100}
+        manager = self._manager()
+        manager._refresh_on = monotonic() + 100
+
+        manager.reset_token('stale_access_token')
+
+        self.assertEqual(manager.get_token(), 'new_access_token')
+
+
+class TokenManagerJwtExpiryTestCase(BaseTokenManagerTestCase):
+
+    def _access_token(self, expires_in):
+        return encode_jwt({'exp': time.time() + expires_in})
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_use_exp_claim_without_expires_in(self, _request_token):
+        _request_token.return_value = {
+            'access_token': self._access_token(100)}
+        manager = TokenManager(self.END_POINT, self.CLIENT_ID,
+                               self.CLIENT_SECRET, token_jwt_expiry=True,
+                               token_clock_skew=10)
+
+        manager.get_token()
+        manager.get_token()
+
+        self.assertEqual(_request_token.call_count, 1)
+        self.assertAlmostEqual(manager._token.expires_in(), 89, delta=1)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_prefer_exp_claim_to_expires_in(self, _request_token):
+        _request_token.return_value = {
+            'access_token': self._access_token(100), 'expires_in': 3600}
+        manager = TokenManager(self.END_POINT, self.CLIENT_ID,
+                               self.CLIENT_SECRET, token_jwt_expiry=True)
+
+        manager.get_token()
+
+        self.assertAlmostEqual(manager._token.expires_in(), 99, delta=1)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_use_expires_in_of_opaque_tokens(self, _request_token):
+        _request_token.return_value = {'access_token': 'opaque',
+                                       'expires_in': 100}
+        manager = TokenManager(self.END_POINT, self.CLIENT_ID,
+                               self.CLIENT_SECRET, token_jwt_expiry=True)
+
+        manager.get_token()
+
+        self.assertAlmostEqual(manager._token.expires_in(), 99, delta=1)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_NOT_decode_tokens_by_default(self, _request_token):
+        _request_token.return_value = {
+            'access_token': self._access_token(100), 'expires_in': 50}
+        manager = TokenManager(self.END_POINT, self.CLIENT_ID,
+                               self.CLIENT_SECRET)
+
+        manager.get_token()
+
+        self.assertAlmostEqual(manager._token.expires_in(), 49, delta=1)
+
+
+class SharedStorage(object):
+
+    def __init__(self, manager):
+        self.storage = manager.dict()
+        self.lock = manager.Lock()
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.storage[key] = value
+
+    def add(self, key, value, timeout):
+        with self.lock:
+            if self.storage.get(key) is not None:
+                return False
+            self.storage[key] = value
+            return True
+
+    def delete(self, key):
+        self.storage.pop(key, None)
+
+
+class SharedGetSetStorage(object):
+
+    def __init__(self, manager):
+        self.storage = manager.dict()
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def set(self, key, value):
+        self.storage[key] = value
+
+
+class TokenManagerLeaseTestCase(BaseTokenManagerTestCase):
+
+    PROCESSES = 8
+
+    def setUp(self):
+        self.context = multiprocessing.get_context('fork')
+        self.processes_manager = self.context.Manager()
+        self.requests = self.context.Value('i', 0)
+
+    def tearDown(self):
+        self.processes_manager.shutdown()
+
+    def _request_token(self):
+        with self.requests.get_lock():
+            self.requests.value += 1
+        time.sleep(0.2)
+        return {'access_token': 'access_token', 'expires_in': 100}
+
+    def _get_tokens(self, storage):
+        tokens = self.processes_manager.list()
+        start = self.context.Event()
+
+        def get_token():
+            manager = TokenManager(
+                self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET,
+                token_storage=storage, token_lease_ttl=5)
+            start.wait()
+            tokens.append(manager.get_token())
+
+        with patch('alf.managers.TokenManager._request_token',
+                   side_effect=self._request_token):
+            processes = [self.context.Process(target=get_token)
+                         for _ in range(self.PROCESSES)]
+            for process in processes:
+                process.start()
+            start.set()
+            for process in processes:
+                process.join()
+
+        return list(tokens)
+
+    def test_should_request_token_once_for_concurrent_processes(self):
+        storage = SharedStorage(self.processes_manager)
+
+        tokens = self._get_tokens(storage)
+
+        self.assertEqual(self.requests.value, 1)
+        self.assertEqual(tokens, ['access_token'] * self.PROCESSES)
+
+    def test_should_request_token_once_for_processes_sharing_a_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        storage = FileTokenStorage(os.path.join(directory, 'tokens.json'))
+
+        tokens = self._get_tokens(storage)
+
+        self.assertEqual(self.requests.value, 1)
+        self.assertEqual(tokens, ['access_token'] * self.PROCESSES)
+
+    def test_should_share_token_between_processes_with_get_set_storage(self):
+        storage = SharedGetSetStorage(self.processes_manager)
+
+        tokens = self._get_tokens(storage)
+
+        self.assertTrue(self.requests.value < self.PROCESSES)
+        self.assertEqual(tokens, ['access_token'] * self.PROCESSES)
+
+    @patch('alf.managers.TokenManager._request_token')
+    def test_should_request_token_when_lease_is_not_released(self, _request_token):
+        _request_token.return_value = {'access_token': 'access_token',
+                                       'expires_in': 100}
+        storage = TokenDefaultStorage()
+        manager = TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET,
+            token_storage=storage, token_lease_ttl=0.1)
+        manager._token_storage.acquire_lease(10)
+        manager._token_storage._lease_owner = None
+
+        self.assertEqual(manager.get_token(), 'access_token')
+        self.assertEqual(_request_token.call_count, 1)
+
+
+class TokenManagerSharedStorageTestCase(BaseTokenManagerTestCase):
+
+    def setUp(self):
+        self.storage = TokenDefaultStorage()
+        self.tokens = iter(['access_token', 'new_access_token'])
+        patcher = patch('alf.managers.TokenManager._request_token',
+                        side_effect=self._request_token)
+        self._request_token_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request_token(self):
+        return {'access_token': next(self.tokens), 'expires_in': 100}
+
+    def _manager(self, **kwargs):
+        return TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET,
+            token_storage=self.storage, **kwargs)
+
+    def test_should_not_reset_token_already_replaced(self):
+        manager = self._manager()
+        manager.get_token()
+        manager.reset_token('access_token')
+        manager.get_token()
+
+        manager.reset_token('access_token')
+
+        self.assertEqual(manager.get_token(), 'new_access_token')
+        self.assertEqual(self._request_token_mock.call_count, 2)
+
+    def test_should_use_token_replaced_by_another_process_on_reset(self):
+        manager = self._manager()
+        other_manager = self._manager()
+        manager.get_token()
+        other_manager.get_token()
+
+        manager.reset_token('access_token')
+        manager.get_token()
+        other_manager.reset_token('access_token')
+
+        self.assertEqual(other_manager._token.access_token, 'new_access_token')
+        self.assertEqual(self._request_token_mock.call_count, 2)
+
+    def test_should_drop_token_invalidated_by_another_process(self):
+        manager = self._manager()
+        other_manager = self._manager(token_sync_interval=0)
+        manager.get_token()
+        other_manager.get_token()
+
+        manager.reset_token('access_token')
+
+        self.assertEqual(other_manager.get_token(), 'new_access_token')
+        self.assertEqual(manager.get_token(), 'new_access_token')
+        self.assertEqual(self._request_token_mock.call_count, 2)
+
+    def test_should_check_invalidation_once_per_sync_interval(self):
+        manager = self._manager()
+        other_manager = self._manager(token_sync_interval=100)
+        manager.get_token()
+        other_manager.get_token()
+
+        manager.reset_token('access_token')
+
+        self.assertEqual(other_manager.get_token(), 'access_token')
+
+
+class TokenManagerScopeTestCase(BaseTokenManagerTestCase):
+
+    def setUp(self):
+        self.manager = TokenManager(
+            self.END_POINT, self.CLIENT_ID, self.CLIENT_SECRET)
+
+    def test_should_return_itself_without_scope(self):
+        self.assertIs(self.manager.for_scope(), self.manager)
+        self.assertIs(self.manager.for_scope(''), self.manager)
+
+    def test_should_normalize_scope(self):
+        manager = self.manager.for_scope('write read')
+
+        self.assertIs(self.manager.for_scope(['read', 'write']), manager)
+        self.assertIs(self.manager.for_scope(' read  write '), manager)
+        self.assertEqual(manager._scope, frozenset(['read', 'write']))
+
+    def test_should_share_session_and_storage_with_scoped_managers(self):
+        manager = self.manager.for_scope('read')
+
+        self.assertIs(manager._session, self.manager._session)
+        self.assertIs(manager._token_storage._storage,
+                      self.manager._token_storage._storage)
+        self.assertEqual(manager._token_storage._base_key,
+                         '{}_{}_read'.format(self.END_POINT, self.CLIENT_ID))
+
+    def test_should_key_storage_by_audience(self):
+        manager = self.manager.for_scope('write read', audience='api')
+
+        self.assertEqual(manager._token_storage._base_key,
+                         '{}_{}_read write_api'.format(
+                             self.END_POINT, self.CLIENT_ID))
+
+    @patch('requests.Session.post')
+    def test_should_request_token_with_scope_and_audience(self, post):
+        post.return_value.json.return_value = {}
+        manager = self.manager.for_scope('write read', audience='api')
+
+        manager._request_token()
+
+        post.assert_called_with(self.END_POINT,
+                                timeout=None,
+                                data={'grant_type': 'client_credentials',
+                                      'scope': 'read write',
+                                      'audience': 'api'},
+                                auth=(self.CLIENT_ID, self.CLIENT_SECRET))
+
+    def test_should_reuse_token_of_a_broader_scope(self):
+        manager = self.manager.for_scope('read write')
+        manager._token = Token('access_token', Token.calc_expires_on(10))
+
+        self.assertIs(self.manager.for_scope('read'), manager)
+
+    def test_should_not_reuse_expired_token_of_a_broader_scope(self):
+        manager = self.manager.for_scope('read write')
+
+        self.assertIsNot(self.manager.for_scope('read'), manager)
+
+    def test_should_not_reuse_token_of_another_audience(self):
+        manager = self.manager.for_scope('read write', audience='api')
+        manager._token = Token('access_token', Token.calc_expires_on(10))
+
+        self.assertIsNot(self.manager.for_scope('read', audience='other'),
+                         manager)
+
+    def test_should_prefer_valid_token_of_the_same_scope(self):
+        manager = self.manager.for_scope('read')
+        manager._token = Token('access_token', Token.calc_expires_on(10))
+        broader_manager = self.manager.for_scope('read write')
+        broader_manager._token = Token('access_token',
+                                       Token.calc_expires_on(10))
+
+        self.assertIs(self.manager.for_scope('read'), manager)
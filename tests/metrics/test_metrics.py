@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from alf.client import Client
+from alf.metrics import (InMemoryMetrics, NullMetrics, TOKEN_CACHE_HITS,
+                         TOKEN_CACHE_MISSES, TOKEN_ERRORS,
+                         TOKEN_FETCH_SECONDS, TOKEN_STORAGE_SECONDS,
+                         UNAUTHORIZED_RETRIES)
+from tests.server import StubServer
+
+
+class TestInMemoryMetrics(TestCase):
+
+    def setUp(self):
+        self.metrics = InMemoryMetrics(buckets=(0.1, 1))
+
+    def test_should_count(self):
+        self.metrics.increment('requests_total', source='memory')
+        self.metrics.increment('requests_total', 2, source='memory')
+
+        self.assertEqual(
+            self.metrics.counter('requests_total', source='memory'), 3)
+        self.assertEqual(self.metrics.counter('requests_total'), 0)
+
+    def test_should_observe_in_cumulative_buckets(self):
+        for value in (0.05, 0.5, 5):
+            self.metrics.observe('latency_seconds', value)
+
+        self.assertEqual(self.metrics.histogram('latency_seconds'), {
+            'buckets': {0.1: 1, 1: 2}, 'sum': 5.55, 'count': 3})
+
+    def test_should_time(self):
+        with self.metrics.timer('latency_seconds', operation='get'):
+            pass
+
+        histogram = self.metrics.histogram('latency_seconds',
+                                           operation='get')
+        self.assertEqual(histogram['count'], 1)
+        self.assertEqual(histogram['buckets'][0.1], 1)
+
+    def test_should_export_prometheus_text_format(self):
+        self.metrics.increment('requests_total', source='memory')
+        self.metrics.observe('latency_seconds', 0.5, operation='get')
+
+        self.assertEqual(self.metrics.export(), '\n'.join([
+            '# TYPE requests_total counter',
+            'requests_total{source="memory"} 1',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{operation="get",le="0.1"} 0',
+            'latency_seconds_bucket{operation="get",le="1"} 1',
+            'latency_seconds_bucket{operation="get",le="+Inf"} 1',
+            'latency_seconds_sum{operation="get"} 0.5',
+            'latency_seconds_count{operation="get"} 1',
+        ]) + '\n')
+
+    def test_should_escape_label_values(self):
+        self.metrics.increment('requests_total', path='a"b\\c')
+
+        self.assertIn('requests_total{path="a\\"b\\\\c"} 1',
+                      self.metrics.export())
+
+    def test_null_metrics_should_be_disabled(self):
+        metrics = NullMetrics()
+
+        with metrics.timer('latency_seconds'):
+            metrics.increment('requests_total')
+
+        self.assertFalse(metrics.enabled)
+
+
+class TestClientMetrics(TestCase):
+
+    def setUp(self):
+        self.server = StubServer.start()
+        self.metrics = InMemoryMetrics()
+        self.client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            metrics=self.metrics)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_should_count_token_cache_hits_and_misses(self):
+        for _ in range(3):
+            self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(self.metrics.counter(TOKEN_CACHE_MISSES), 1)
+        self.assertEqual(
+            self.metrics.counter(TOKEN_CACHE_HITS, source='memory'), 2)
+        self.assertEqual(
+            self.metrics.histogram(TOKEN_FETCH_SECONDS)['count'], 1)
+        self.assertEqual(self.metrics.histogram(
+            TOKEN_STORAGE_SECONDS, operation='get')['count'], 1)
+        self.assertEqual(self.metrics.histogram(
+            TOKEN_STORAGE_SECONDS, operation='set')['count'], 1)
+
+    def test_should_count_tokens_found_on_storage(self):
+        self.client.get(self.server.url + '/resource')
+        other_client = Client(
+            token_endpoint=self.server.url + '/token',
+            client_id='client_id',
+            client_secret='client_secret',
+            token_storage=self.client._token_manager._token_storage._storage,
+            metrics=self.metrics)
+
+        other_client.get(self.server.url + '/resource')
+
+        self.assertEqual(
+            self.metrics.counter(TOKEN_CACHE_HITS, source='storage'), 1)
+
+    def test_should_count_unauthorized_retries(self):
+        self.client.get(self.server.url + '/resource')
+        self.server.rejected_authorizations.add('Bearer token-1')
+
+        self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(self.metrics.counter(UNAUTHORIZED_RETRIES), 1)
+
+    def test_should_count_token_errors(self):
+        self.server.token_status = 500
+
+        self.client.get(self.server.url + '/resource')
+
+        self.assertEqual(self.metrics.counter(TOKEN_ERRORS), 1)
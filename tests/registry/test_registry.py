@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from mock import patch
+
+from alf.managers import TokenManager
+from alf.registry import TokenManagerRegistry, shared_registry
+
+
+class TokenManagerRegistryTestCase(TestCase):
+
+    END_POINT = 'http://endpoint/token'
+
+    def test_should_return_the_same_manager_for_the_same_credentials(self):
+        registry = TokenManagerRegistry()
+
+        manager = registry.get(self.END_POINT, 'client_id', 'secret')
+
+        self.assertIsInstance(manager, TokenManager)
+        self.assertIs(registry.get(self.END_POINT, 'client_id', 'secret'),
+                      manager)
+        self.assertEqual(len(registry), 1)
+
+    def test_should_key_managers_by_cache_key(self):
+        registry = TokenManagerRegistry()
+
+        manager = registry.get(self.END_POINT, 'client_id', 'secret')
+
+        self.assertIn(manager._get_cache_key(), registry)
+
+    def test_should_return_different_managers_for_different_clients(self):
+        registry = TokenManagerRegistry()
+
+        manager = registry.get(self.END_POINT, 'client_id', 'secret')
+        other_manager = registry.get(self.END_POINT, 'other_id', 'secret')
+
+        self.assertIsNot(manager, other_manager)
+        self.assertEqual(len(registry), 2)
+
+    def test_should_share_the_token_session(self):
+        registry = TokenManagerRegistry()
+
+        manager = registry.get(self.END_POINT, 'client_id', 'secret')
+        other_manager = registry.get(self.END_POINT, 'other_id', 'secret')
+
+        self.assertIs(manager._session, registry._session)
+        self.assertIs(other_manager._session, registry._session)
+
+    def test_should_create_managers_with_options(self):
+        registry = TokenManagerRegistry(token_refresh_ratio=0.5)
+
+        manager = registry.get(self.END_POINT, 'client_id', 'secret')
+
+        self.assertEqual(manager._token_refresh_ratio, 0.5)
+
+    def test_should_update_client_secret(self):
+        registry = TokenManagerRegistry()
+
+        registry.get(self.END_POINT, 'client_id', 'secret')
+        manager = registry.get(self.END_POINT, 'client_id', 'new_secret')
+
+        self.assertEqual(manager._client_secret, 'new_secret')
+
+    def test_should_evict_least_recently_used_manager(self):
+        registry = TokenManagerRegistry(max_size=2)
+
+        first = registry.get(self.END_POINT, 'first', 'secret')
+        second = registry.get(self.END_POINT, 'second', 'secret')
+        registry.get(self.END_POINT, 'first', 'secret')
+        registry.get(self.END_POINT, 'third', 'secret')
+
+        self.assertEqual(len(registry), 2)
+        self.assertIn(first._get_cache_key(), registry)
+        self.assertNotIn(second._get_cache_key(), registry)
+
+    @patch('alf.registry.monotonic')
+    def test_should_evict_managers_not_used_within_ttl(self, monotonic):
+        registry = TokenManagerRegistry(ttl=10)
+
+        monotonic.return_value = 100
+        first = registry.get(self.END_POINT, 'first', 'secret')
+        monotonic.return_value = 105
+        second = registry.get(self.END_POINT, 'second', 'secret')
+        monotonic.return_value = 111
+        registry.get(self.END_POINT, 'second', 'secret')
+
+        self.assertNotIn(first._get_cache_key(), registry)
+        self.assertIn(second._get_cache_key(), registry)
+
+    def test_should_clear_managers(self):
+        registry = TokenManagerRegistry()
+        registry.get(self.END_POINT, 'client_id', 'secret')
+
+        registry.clear()
+
+        self.assertEqual(len(registry), 0)
+
+
+class TokenManagerRegistryReferencesTestCase(TestCase):
+
+    END_POINT = 'http://endpoint/token'
+
+    def setUp(self):
+        self.registry = TokenManagerRegistry()
+
+    def test_should_keep_manager_until_every_acquire_is_released(self):
+        manager = self.registry.acquire(self.END_POINT, 'client_id', 'secret')
+        self.assertIs(
+            self.registry.acquire(self.END_POINT, 'client_id', 'secret'),
+            manager)
+
+        self.registry.release(self.END_POINT, 'client_id')
+        self.assertIn(manager._get_cache_key(), self.registry)
+
+        self.registry.release(self.END_POINT, 'client_id')
+        self.assertNotIn(manager._get_cache_key(), self.registry)
+
+    def test_should_create_manager_with_options_of_the_first_acquire(self):
+        manager = self.registry.acquire(self.END_POINT, 'client_id', 'secret',
+                                        token_refresh_ratio=0.5)
+        self.registry.acquire(self.END_POINT, 'client_id', 'secret',
+                              token_refresh_ratio=0.8)
+
+        self.assertEqual(manager._token_refresh_ratio, 0.5)
+
+    def test_should_ignore_release_of_unknown_managers(self):
+        self.registry.release(self.END_POINT, 'client_id')
+
+        self.assertEqual(len(self.registry), 0)
+
+
+class SharedRegistryTestCase(TestCase):
+
+    def test_should_return_one_registry_per_token_manager_class(self):
+        class OtherTokenManager(TokenManager):
+            pass
+
+        registry = shared_registry()
+
+        self.assertIs(shared_registry(), registry)
+        self.assertIs(shared_registry(TokenManager), registry)
+        self.assertIsNot(shared_registry(OtherTokenManager), registry)
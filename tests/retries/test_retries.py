@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import email.utils
+import time
+from unittest import TestCase
+
+import requests
+from mock import Mock, patch
+
+from alf.retries import ResourceRetry, RetryBudget
+
+
+class TestRetryBudget(TestCase):
+
+    @patch('alf.retries.monotonic')
+    def test_should_allow_min_retries_without_traffic(self, monotonic):
+        monotonic.return_value = 100
+        budget = RetryBudget(ratio=0.1, min_retries=2)
+
+        self.assertEqual([budget.withdraw('api') for _ in range(3)],
+                         [True, True, False])
+
+    @patch('alf.retries.monotonic')
+    def test_should_allow_retries_up_to_a_ratio_of_requests(self, monotonic):
+        monotonic.return_value = 100
+        budget = RetryBudget(ratio=0.1, min_retries=0)
+        for _ in range(30):
+            budget.record_request()
+
+        self.assertEqual([budget.withdraw('api') for _ in range(4)],
+                         [True, True, True, False])
+
+    @patch('alf.retries.monotonic')
+    def test_should_forget_requests_out_of_the_window(self, monotonic):
+        monotonic.return_value = 100
+        budget = RetryBudget(ratio=0.1, min_retries=1, window=10)
+        budget.withdraw('api')
+        self.assertFalse(budget.withdraw('api'))
+
+        monotonic.return_value = 110
+
+        self.assertTrue(budget.withdraw('api'))
+
+    @patch('alf.retries.monotonic')
+    def test_should_count_retries_and_rejections_per_host(self, monotonic):
+        monotonic.return_value = 100
+        budget = RetryBudget(min_retries=1)
+
+        budget.withdraw('api')
+        budget.withdraw('api')
+        budget.withdraw('other-api')
+
+        self.assertEqual(budget.stats(), {
+            'api': {'retries': 1, 'rejected': 1},
+            'other-api': {'retries': 0, 'rejected': 1},
+        })
+
+
+class TestResourceRetry(TestCase):
+
+    def _response(self, status_code, headers=None):
+        return Mock(status_code=status_code, headers=headers or {})
+
+    def test_should_build_from_number_of_retries(self):
+        retry = ResourceRetry.from_value(2)
+
+        self.assertEqual(retry.total, 2)
+        self.assertIs(ResourceRetry.from_value(retry), retry)
+        self.assertIsNone(ResourceRetry.from_value(None))
+
+    def test_should_retry_idempotent_methods_only(self):
+        retry = ResourceRetry()
+
+        self.assertTrue(retry.is_retryable_method('get'))
+        self.assertTrue(retry.is_retryable_method('PUT'))
+        self.assertFalse(retry.is_retryable_method('POST'))
+
+    def test_should_retry_unavailable_responses_and_connection_errors(self):
+        retry = ResourceRetry()
+
+        self.assertTrue(retry.is_retryable(self._response(503)))
+        self.assertFalse(retry.is_retryable(self._response(500)))
+        self.assertTrue(retry.is_retryable(
+            error=requests.ConnectionError()))
+        self.assertTrue(retry.is_retryable(error=requests.ReadTimeout()))
+
+    @patch('alf.retries.random.uniform')
+    def test_should_backoff_exponentially_with_jitter(self, uniform):
+        uniform.side_effect = lambda low, high: high
+        retry = ResourceRetry(backoff_factor=0.5, max_backoff=3)
+
+        self.assertEqual([retry.backoff(attempt) for attempt in range(4)],
+                         [0.5, 1, 2, 3])
+
+    def test_should_wait_for_retry_after_seconds(self):
+        retry = ResourceRetry()
+
+        self.assertEqual(
+            retry.backoff(0, self._response(503, {'Retry-After': '7'})), 7)
+
+    def test_should_wait_for_retry_after_date(self):
+        retry = ResourceRetry()
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+
+        self.assertAlmostEqual(
+            retry.backoff(0, self._response(503, {'Retry-After': date})),
+            30, delta=1.5)
+
+    def test_should_ignore_retry_after_when_disabled(self):
+        retry = ResourceRetry(respect_retry_after=False, backoff_factor=0)
+
+        self.assertEqual(
+            retry.backoff(0, self._response(503, {'Retry-After': '7'})), 0)
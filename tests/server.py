@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _reply(self, status, body, headers=None):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size)
+                self.rfile.readline()
+                if not size:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _token(self):
+        server = self.server
+        with server.lock:
+            server.token_requests += 1
+            access_token = 'token-{}'.format(server.token_requests)
+        time.sleep(server.latency)
+
+        if server.token_status != 200:
+            return self._reply(server.token_status, {'error': 'error'})
+
+        self._reply(200, {'access_token': access_token,
+                          'expires_in': server.expires_in})
+
+    def _resource(self, body):
+        server = self.server
+        with server.lock:
+            delay = server.delays.pop(0) if server.delays else 0
+        time.sleep(server.latency + delay)
+        authorization = self.headers.get('Authorization')
+        with server.lock:
+            server.requests.append((self.command, self.path, body))
+            failure = server.failures.pop(0) if server.failures else None
+        if failure is not None:
+            status, headers = failure
+            return self._reply(status, {'error': 'failure'}, headers)
+        if authorization in server.rejected_authorizations:
+            return self._reply(401, {'error': 'unauthorized'})
+
+        etag = server.response_headers.get('ETag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            for name, value in server.response_headers.items():
+                self.send_header(name, value)
+            return self.end_headers()
+
+        self._reply(200, {'authorization': authorization,
+                          'body': body.decode('utf-8')},
+                    server.response_headers)
+
+    def _handle(self):
+        body = self._read_body()
+        if self.path == '/token':
+            return self._token()
+        self._resource(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.token_requests = 0
+        self.token_status = 200
+        self.expires_in = 100
+        self.latency = 0
+        self.connections = 0
+        self.rejected_authorizations = set()
+        self.requests = []
+        # (status, headers) answered to the next resource requests.
+        self.failures = []
+        # Extra seconds waited by the next resource requests.
+        self.delays = []
+        # Headers of the resource responses, answered with a 304 when the
+        # request has the same ETag.
+        self.response_headers = {}
+        self.not_modified = 0
+
+    @classmethod
+    def start(cls):
+        server = cls()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from alf.storages import FileTokenStorage
+from alf.tokens import Token, TokenStorage
+
+
+class TestFileTokenStorage(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tokens.json')
+        self.storage = FileTokenStorage(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_should_get_nothing_without_file(self):
+        self.assertIsNone(self.storage.get('key'))
+
+    def test_should_share_values_between_instances(self):
+        self.storage.set('key', 'value')
+
+        self.assertEqual(FileTokenStorage(self.path).get('key'), 'value')
+
+    def test_should_keep_keys_written_by_other_instances(self):
+        other_storage = FileTokenStorage(self.path)
+        self.storage.get('key')
+
+        other_storage.set('other_key', 'other_value')
+        self.storage.set('key', 'value')
+
+        self.assertEqual(other_storage.get('key'), 'value')
+        self.assertEqual(other_storage.get('other_key'), 'other_value')
+
+    def test_should_see_changes_of_other_instances(self):
+        other_storage = FileTokenStorage(self.path)
+        self.storage.set('key', 'value')
+        other_storage.get('key')
+
+        self.storage.set('key', 'new_value')
+
+        self.assertEqual(other_storage.get('key'), 'new_value')
+
+    @patch('alf.storages.time.time')
+    def test_should_expire_values(self, time):
+        time.return_value = 1000
+        self.storage.set('key', 'value', 10)
+        self.storage.setex('other_key', 20, 'other_value')
+
+        time.return_value = 1010
+
+        self.assertIsNone(self.storage.get('key'))
+        self.assertEqual(self.storage.get('other_key'), 'other_value')
+
+    @patch('alf.storages.time.time')
+    def test_should_add_only_absent_or_expired_values(self, time):
+        time.return_value = 1000
+
+        self.assertTrue(self.storage.add('key', 'value', 10))
+        self.assertFalse(self.storage.add('key', 'other_value', 10))
+
+        time.return_value = 1010
+        self.assertTrue(self.storage.add('key', 'other_value', 10))
+        self.assertEqual(self.storage.get('key'), 'other_value')
+
+    def test_should_delete(self):
+        self.storage.set('key', 'value')
+
+        self.storage.delete('key')
+
+        self.assertIsNone(self.storage.get('key'))
+
+    def test_should_read_the_file_only_when_it_changes(self):
+        self.storage.set('key', 'value')
+
+        with patch('alf.storages.open', create=True) as open_file:
+            for _ in range(3):
+                self.assertEqual(self.storage.get('key'), 'value')
+
+        self.assertFalse(open_file.called)
+
+    def test_should_store_tokens(self):
+        token = Token('access_token', Token.calc_expires_on(100))
+        TokenStorage(self.storage, 'base')(token)
+
+        token_data = TokenStorage(FileTokenStorage(self.path),
+                                  'base').request_token()
+
+        self.assertEqual(token_data['access_token'], 'access_token')
+
+    def test_should_not_leave_temporary_files(self):
+        for index in range(3):
+            self.storage.set('key', str(index))
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['tokens.json', 'tokens.json.lock'])
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import redis
 import memcache
+import time
 import unittest
 
 from alf.managers import Token
 from alf.tokens import TokenStorage, TokenDefaultStorage
 from datetime import datetime, timedelta
 from freezegun import freeze_time
+from mock import Mock, patch
 
 
 class TestToken(unittest.TestCase):
@@ -33,6 +35,26 @@ class TestToken(unittest.TestCase):
                       expires_on=Token.calc_expires_on(10))
         self.assertTrue(token.is_valid(), self.storage_obj)
 
+    def test_should_not_have_instance_dict(self):
+        token = Token(access_token='access_token')
+        self.assertFalse(hasattr(token, '__dict__'))
+
+    def test_should_know_when_it_expires(self):
+        with patch('alf.tokens.monotonic', return_value=100.0):
+            token = Token(access_token='access_token',
+                          expires_on=Token.calc_expires_on(10))
+        with patch('alf.tokens.monotonic', return_value=105.0):
+            self.assertAlmostEqual(token.expires_in(), 5, places=2)
+        with patch('alf.tokens.monotonic', return_value=111.0):
+            self.assertFalse(token.is_valid())
+
+    def test_should_not_be_affected_by_wall_clock_changes(self):
+        token = Token(access_token='access_token',
+                      expires_on=Token.calc_expires_on(10))
+        with patch('alf.tokens.datetime') as wall_clock:
+            wall_clock.now.return_value = datetime.now() + timedelta(hours=1)
+            self.assertTrue(token.is_valid())
+
 
 class TestTokenStorage(unittest.TestCase):
 
@@ -44,11 +66,12 @@ class TestTokenStorage(unittest.TestCase):
                       expires_on=Token.calc_expires_on(10))
         token_storage = TokenStorage(self.storage_obj, 'test')
         token_storage(token)
-        self.assertEqual(self.storage_obj.get(token_storage.token_key), 'access_token')
 
-        expires = str(token.expires_on)
-        self.assertEqual(self.storage_obj.get(token_storage.expires_key), expires, self.storage_obj)
+        record = self.storage_obj.get(token_storage.record_key)
+        self.assertEqual(TokenStorage.decode(record),
+                         ('access_token', token.expires_on))
 
+        self.assertEqual('test_token', token_storage.record_key)
         self.assertEqual('test_access_token', token_storage.token_key)
         self.assertEqual('test_expires_on', token_storage.expires_key)
 
@@ -66,13 +89,33 @@ class TestTokenStorage(unittest.TestCase):
     def test_storage_should_add_retrieve_token(self):
         token = Token(access_token='access_token',
                       expires_on=Token.calc_expires_on(10))
-        expires = str(token.expires_on)
         token_storage = TokenStorage(self.storage_obj)
         token_storage(token)
         token_requested = token_storage.request_token()
         self.assertEqual(len(token_requested), 2)
-        self.assertEqual(self.storage_obj.get(token_storage.token_key), 'access_token')
-        self.assertEqual(self.storage_obj.get(token_storage.expires_key), expires, self.storage_obj)
+        self.assertEqual(token_requested['access_token'], 'access_token')
+        self.assertEqual(token_requested['expires_on'], token.expires_on)
+
+    def test_storage_should_retrieve_token_stored_on_separate_keys(self):
+        token = Token(access_token='access_token',
+                      expires_on=Token.calc_expires_on(10))
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        self.storage_obj.set(token_storage.token_key, 'access_token')
+        self.storage_obj.set(token_storage.expires_key, token.expires_on.strftime(
+            TokenStorage.TOKEN_EXPIRES_FORMAT))
+
+        token_requested = token_storage.request_token()
+
+        self.assertEqual(token_requested['access_token'], 'access_token')
+        self.assertEqual(token_requested['expires_on'], token.expires_on)
+
+    def test_storage_should_not_retrieve_expired_token(self):
+        token = Token(access_token='access_token',
+                      expires_on=Token.calc_expires_on(-10))
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        token_storage(token)
+
+        self.assertEqual(token_storage.request_token(), {})
 
     def test_storage_should_add_just_once_same_value(self):
         expires_datetime = Token.calc_expires_on(10)
@@ -90,6 +133,232 @@ class TestTokenStorage(unittest.TestCase):
         self.assertEqual(token_requested.get('access_token'), 'access_token')
         self.assertEqual(token_requested.get('expires_on'), expires, self.storage_obj)
 
+    def test_storage_should_acquire_lease_once(self):
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+
+        self.assertTrue(token_storage.acquire_lease(10))
+        self.assertFalse(other_token_storage.acquire_lease(10))
+
+    def test_storage_should_release_lease(self):
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+
+        token_storage.acquire_lease(10)
+        token_storage.release_lease()
+
+        self.assertTrue(other_token_storage.acquire_lease(10))
+
+    def test_storage_should_not_release_lease_of_others(self):
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+
+        token_storage.acquire_lease(10)
+        other_token_storage.release_lease()
+
+        self.assertFalse(other_token_storage.acquire_lease(10))
+
+
+    def test_storage_should_invalidate_rejected_token(self):
+        token = Token(access_token='access_token',
+                      expires_on=Token.calc_expires_on(10))
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+        token_storage(token)
+        other_token_storage.is_invalidated()
+
+        self.assertEqual(token_storage.invalidate('access_token'), {})
+
+        self.assertEqual(token_storage.request_token(), {})
+        self.assertTrue(other_token_storage.is_invalidated())
+        self.assertFalse(other_token_storage.is_invalidated())
+
+    def test_storage_should_return_token_replacing_rejected_one(self):
+        token = Token(access_token='new_access_token',
+                      expires_on=Token.calc_expires_on(10))
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+        token_storage(token)
+        other_token_storage.is_invalidated()
+
+        token_data = token_storage.invalidate('access_token')
+
+        self.assertEqual(token_data['access_token'], 'new_access_token')
+        self.assertFalse(other_token_storage.is_invalidated())
+
+    def test_storage_should_invalidate_token_once(self):
+        token = Token(access_token='access_token',
+                      expires_on=Token.calc_expires_on(10))
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+        token_storage(token)
+        token_storage.invalidate('access_token')
+        generation = self.storage_obj.get(token_storage.generation_key)
+
+        other_token_storage.invalidate('access_token')
+
+        self.assertEqual(
+            self.storage_obj.get(token_storage.generation_key), generation)
+
+
+class TestTokenStorageWithAdd(TestTokenStorage):
+
+    def setUp(self):
+        self.storage_obj = FakeStorageWithAdd()
+
+    def test_storage_should_add_lease_with_ttl(self):
+        token_storage = TokenStorage(self.storage_obj, 'test')
+
+        token_storage.acquire_lease(0.5)
+
+        self.assertEqual(self.storage_obj.timeouts[token_storage.lease_key], 1)
+
+    def test_storage_should_acquire_expired_lease(self):
+        token_storage = TokenStorage(self.storage_obj, 'test')
+        other_token_storage = TokenStorage(self.storage_obj, 'test')
+
+        token_storage.acquire_lease(1)
+        self.storage_obj.expires[token_storage.lease_key] = time.time()
+
+        self.assertTrue(other_token_storage.acquire_lease(1))
+
+
+class TestTokenStorageLeaseFallback(unittest.TestCase):
+
+    def test_storage_should_acquire_expired_lease(self):
+        storage_obj = TokenDefaultStorage()
+        token_storage = TokenStorage(storage_obj, 'test')
+        other_token_storage = TokenStorage(storage_obj, 'test')
+
+        token_storage.acquire_lease(0.01)
+        time.sleep(0.02)
+
+        self.assertTrue(other_token_storage.acquire_lease(10))
+
+    def test_storage_should_check_lease_after_writing_it(self):
+        storage_obj = TokenDefaultStorage()
+        token_storage = TokenStorage(storage_obj, 'test')
+        other_token_storage = TokenStorage(storage_obj, 'test')
+
+        original_set = storage_obj.set
+
+        def racing_set(key, value):
+            original_set(key, value)
+            if key == token_storage.lease_key:
+                original_set(key, 'other:{}'.format(time.time() + 10))
+
+        storage_obj.set = racing_set
+
+        self.assertFalse(token_storage.acquire_lease(10))
+        self.assertFalse(other_token_storage.acquire_lease(10))
+
+
+class FakeStorageWithAdd(TokenDefaultStorage):
+
+    def __init__(self):
+        super(FakeStorageWithAdd, self).__init__()
+        self.expires = {}
+        self.timeouts = {}
+
+    def get(self, key):
+        if self.expires.get(key, float('inf')) <= time.time():
+            self.delete(key)
+        return super(FakeStorageWithAdd, self).get(key)
+
+    def set(self, key, value, timeout=None):
+        super(FakeStorageWithAdd, self).set(key, value)
+        self.timeouts[key] = timeout
+
+    def add(self, key, value, timeout):
+        if self.get(key) is not None:
+            return False
+        self.set(key, value, timeout)
+        self.expires[key] = time.time() + timeout
+        return True
+
+    def delete(self, key):
+        self.storage.pop(key, None)
+        self.expires.pop(key, None)
+
+
+class TestTokenStorageRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.token = Token(access_token='access_token',
+                           expires_on=Token.calc_expires_on(10))
+
+    @freeze_time('2015-01-01 10:12:10.000001')
+    def test_should_encode_token_with_expiration_epoch(self):
+        expires_on = Token.calc_expires_on(10)
+        epoch = int(time.mktime(expires_on.timetuple()))
+
+        record = TokenStorage.encode(Token('access|token', expires_on))
+
+        self.assertEqual(record, '{}000001|access|token'.format(epoch))
+        self.assertEqual(TokenStorage.decode(record),
+                         ('access|token', expires_on))
+        self.assertEqual(TokenStorage.decode(record.encode('utf-8')),
+                         ('access|token', expires_on))
+
+    def test_should_store_token_with_a_single_set(self):
+        storage_obj = Mock(spec=['get', 'set'])
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        token_storage(self.token)
+
+        storage_obj.set.assert_called_once_with(
+            'test_token', TokenStorage.encode(self.token))
+
+    def test_should_store_token_with_expiration_using_setex(self):
+        storage_obj = Mock(spec=['get', 'set', 'setex'])
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        token_storage(self.token)
+
+        self.assertFalse(storage_obj.set.called)
+        storage_obj.setex.assert_called_once_with(
+            'test_token', 10, TokenStorage.encode(self.token))
+
+    def test_should_store_token_with_expiration_using_set_timeout(self):
+        storage_obj = Mock(spec=['get', 'set', 'add'])
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        token_storage(self.token)
+
+        storage_obj.set.assert_called_once_with(
+            'test_token', TokenStorage.encode(self.token), 10)
+
+    def test_should_retrieve_token_with_a_single_get(self):
+        storage_obj = Mock(spec=['get', 'set'])
+        storage_obj.get.return_value = TokenStorage.encode(self.token)
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        token_storage.request_token()
+
+        storage_obj.get.assert_called_once_with('test_token')
+
+    def test_should_retrieve_token_with_a_single_mget(self):
+        storage_obj = Mock(spec=['get', 'set', 'mget'])
+        storage_obj.mget.return_value = [None, 'access_token', None]
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        self.assertEqual(token_storage.request_token(), {})
+
+        storage_obj.mget.assert_called_once_with(
+            ['test_token', 'test_access_token', 'test_expires_on'])
+        self.assertFalse(storage_obj.get.called)
+
+    def test_should_retrieve_token_with_a_single_get_multi(self):
+        storage_obj = Mock(spec=['get', 'set', 'get_multi'])
+        storage_obj.get_multi.return_value = {
+            'test_token': TokenStorage.encode(self.token)}
+        token_storage = TokenStorage(storage_obj, 'test')
+
+        token_requested = token_storage.request_token()
+
+        self.assertEqual(token_requested['access_token'], 'access_token')
+        self.assertFalse(storage_obj.get.called)
+
 
 class TestTokenRedis(TestTokenStorage):
 